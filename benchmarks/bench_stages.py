@@ -0,0 +1,595 @@
+# coding=utf-8
+"""
+Stage-level benchmarks of maya_playblast, run against the fake Maya/Shotgun backends of benchmarks/stubs.py.
+
+    python benchmarks/bench_stages.py                  # run every case, write benchmarks/results.json
+    python benchmarks/bench_stages.py --quick          # skip the largest sizes
+    python benchmarks/bench_stages.py --save-baseline  # store the results as benchmarks/baseline.json
+    python benchmarks/bench_stages.py -k render        # only the cases whose name contains "render"
+
+When a baseline exists every case is compared against it and the run exits with 1 if a case got slower
+than the baseline median by more than the tolerance.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import stubs  # noqa: E402
+
+DEFAULT_RESULTS = os.path.join(BENCH_DIR, 'results.json')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+DEFAULT_TOLERANCE = 0.5
+# cold import of the dialog, the interpreter start up excluded
+DIALOG_IMPORT_BUDGET = 0.25
+# timer noise on the fastest cases, never reported as a regression
+ABSOLUTE_SLACK = 0.002
+
+CASES = []
+
+
+def case(name, sizes=(None,), quick_sizes=None):
+    """
+    Register a benchmark case. The decorated function gets (state, root_dir, size), does its setup
+    and returns the callable to time. A metrics dict set on the callable is reported with the timings.
+    """
+    def register(function):
+        CASES.append(dict(name=name, function=function, sizes=sizes,
+                          quick_sizes=sizes if quick_sizes is None else quick_sizes))
+        return function
+    return register
+
+
+def make_sequence(directory, base_name, frame_count, first_frame=1, frame_bytes=0):
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+    # start and end of image markers around the payload, so the frames pass the integrity check
+    payload = b'\xff\xd8' + b'\0' * frame_bytes + b'\xff\xd9'
+    for frame in range(first_frame, first_frame + frame_count):
+        with open(os.path.join(directory, '{}.{:04d}.jpg'.format(base_name, frame)), 'wb') as f:
+            f.write(payload)
+    return os.path.join(directory, base_name)
+
+
+@case('get_output_path/listing', sizes=(100, 1000, 5000), quick_sizes=(100, 1000))
+def output_path_listing(state, root_dir, versions_count):
+    from shotgun import context
+    from maya_playblast import playblast, versions
+    user_dir = context.get_userdir('flipbook')
+    if os.path.isdir(user_dir):
+        shutil.rmtree(user_dir)
+    os.makedirs(user_dir)
+    for version in range(1, versions_count + 1):
+        os.mkdir(os.path.join(user_dir, versions.format_version(version)))
+    index_path = os.path.join(user_dir, versions.INDEX_FILE_NAME)
+
+    def run():
+        # without the index the flipbook dir is listed
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        playblast.get_output_path()
+    return run
+
+
+@case('get_output_path/indexed', sizes=(100, 1000, 5000), quick_sizes=(100, 1000))
+def output_path_indexed(state, root_dir, versions_count):
+    from maya_playblast import playblast
+    output_path_listing(state, root_dir, versions_count)
+    playblast.get_output_path()
+    return playblast.get_output_path
+
+
+def _allocate_versions(args):
+    # a process of the versions/concurrent case: wait for the common start, then allocate as fast as possible
+    user_dir, count, start_at = args
+    from maya_playblast import versions
+    time.sleep(max(0, start_at - time.time()))
+    return [versions.allocate_version(user_dir)[0] for _ in range(count)]
+
+
+@case('versions/concurrent', sizes=(8, 32), quick_sizes=(8,))
+def versions_concurrent(state, root_dir, process_count):
+    # process_count processes allocating 10 versions each at the same moment, every version must be unique
+    from maya_playblast import versions
+    # the timing includes the process start up and the 0.2s wait for the common start
+    per_process = 10
+    runs = []
+
+    def run():
+        runs.append(None)
+        user_dir = os.path.join(root_dir, 'concurrent', str(process_count), str(len(runs)))
+        pool = multiprocessing.Pool(process_count)
+        try:
+            start_at = time.time() + 0.2
+            allocated = [version for versions_of_process in
+                         pool.map(_allocate_versions, [(user_dir, per_process, start_at)] * process_count, 1)
+                         for version in versions_of_process]
+        finally:
+            pool.close()
+            pool.join()
+        expected = process_count * per_process
+        assert len(set(allocated)) == expected, '{} duplicate version(s)'.format(expected - len(set(allocated)))
+        assert versions.scan_last_version(user_dir) == expected
+        assert versions.read_index(user_dir) <= expected
+    return run
+
+
+@case('import/dialog')
+def import_dialog(state, root_dir, size):
+    # opening the dialog must not pay for pymel, the playblast module or the resource collector
+    import subprocess
+    hidden = ['pymel.core', 'maya_playblast.playblast', 'resource_collector']
+    command = [sys.executable, os.path.join(BENCH_DIR, 'stubs.py'), 'import', 'maya_playblast.dialog'] + hidden
+
+    def run():
+        result = json.loads(subprocess.check_output(command).decode('utf-8').strip().splitlines()[-1])
+        assert not result['imported'], 'maya_playblast.dialog imports {}'.format(', '.join(result['imported']))
+        assert not result['error'], result['error']
+        assert result['seconds'] < DIALOG_IMPORT_BUDGET, 'maya_playblast.dialog imported in {:.3f}s, budget {}s'.format(
+            result['seconds'], DIALOG_IMPORT_BUDGET)
+        run.metrics['import_seconds'] = round(result['seconds'], 4)
+    run.metrics = {}
+    return run
+
+
+@case('save_temp_scene/modified', sizes=(1024 * 1024, 64 * 1024 * 1024), quick_sizes=(1024 * 1024,))
+def save_temp_scene_modified(state, root_dir, scene_bytes):
+    from maya_playblast import playblast
+    state.scene_bytes = scene_bytes
+
+    def run():
+        state.modified = True
+        playblast.save_temp_scene()
+    return run
+
+
+@case('save_temp_scene/unmodified', sizes=(1024 * 1024, 64 * 1024 * 1024), quick_sizes=(1024 * 1024,))
+def save_temp_scene_unmodified(state, root_dir, scene_bytes):
+    from maya_playblast import playblast
+    state.scene_bytes = scene_bytes
+    if not os.path.isdir(os.path.dirname(state.scene_path)):
+        os.makedirs(os.path.dirname(state.scene_path))
+    with open(state.scene_path, 'wb') as f:
+        f.write(b'\0' * scene_bytes)
+    state.modified = False
+    playblast.save_temp_scene()
+
+    def run():
+        state.modified = False
+        playblast.save_temp_scene()
+    return run
+
+
+@case('resolution/sg_cold')
+def resolution_sg_cold(state, root_dir, size):
+    from maya_playblast import playblast, sg_cache
+    state.sg_latency = 0.05
+
+    def run():
+        sg_cache.invalidate('dailies_resolution')
+        playblast.get_dailies_resolution_from_sg()
+    return run
+
+
+@case('resolution/sg_cached')
+def resolution_sg_cached(state, root_dir, size):
+    from maya_playblast import playblast
+    state.sg_latency = 0.05
+    playblast.get_dailies_resolution_from_sg()
+    return playblast.get_dailies_resolution_from_sg
+
+
+@case('resolution/camera')
+def resolution_camera(state, root_dir, size):
+    from maya_playblast import playblast
+    return playblast.get_dailies_resolution_from_camera
+
+
+@case('render_playblast/glob', sizes=(100, 1000, 10000, 100000), quick_sizes=(100, 1000, 10000))
+def render_playblast_glob(state, root_dir, frame_count):
+    from maya_playblast import playblast
+    output_path = make_sequence(os.path.join(root_dir, 'frames', str(frame_count)), 'shot', frame_count)
+
+    def run():
+        playblast.render_playblast('shotCam', output_path, resolution=(1920, 1080), save_temp=False,
+                                   start_frame=1, end_frame=frame_count)
+    return run
+
+
+@case('sequence/scan', sizes=(1000, 10000, 100000), quick_sizes=(1000, 10000))
+def sequence_scan(state, root_dir, frame_count):
+    # the listing of an unverified playblast, a single directory pass
+    from maya_playblast.sequence import FrameSequence
+    output_path = make_sequence(os.path.join(root_dir, 'frames', 'scan'), 'shot', frame_count)
+    return lambda: FrameSequence.scan(output_path)
+
+
+@case('batch/run_jobs', sizes=(4,))
+def batch_run_jobs(state, root_dir, job_count):
+    # the scheduler against stub mayapy workers: ok jobs, one failing its first attempt, one timing out
+    from maya_playblast import batch
+    batch_dir = os.path.join(root_dir, 'batch')
+    os.environ['MAYA_PLAYBLAST_STUB_ROOT'] = batch_dir
+    mayapy = [sys.executable, os.path.join(BENCH_DIR, 'stubs.py'), 'mayapy']
+    runs = []
+
+    def run():
+        runs.append(None)
+        run_dir = os.path.join(batch_dir, str(len(runs)))
+        jobs = []
+        for index, behaviour in enumerate(['ok'] * (job_count - 2) + ['fail_once', 'hang']):
+            scene_path = os.path.join(run_dir, 'scenes', '{}_{}.ma'.format(behaviour, index))
+            if not os.path.isdir(os.path.dirname(scene_path)):
+                os.makedirs(os.path.dirname(scene_path))
+            with open(scene_path, 'w') as f:
+                f.write(behaviour)
+            jobs.append(dict(scene=scene_path, camera='shotCam', start_frame=1, end_frame=10,
+                             resolution='640x360', output_path=os.path.join(run_dir, 'v001', 'shot_{}'.format(index))))
+        results = batch.run_jobs(jobs, workers=job_count, mayapy=mayapy, timeout=1.5, retries=1,
+                                 log_dir=os.path.join(run_dir, 'logs'))
+        statuses = [(result['status'], result['attempts']) for result in results]
+        expected = [('ok', 1)] * (job_count - 2) + [('ok', 2), ('timeout', 2)]
+        assert statuses == expected, '{}\n{}'.format(statuses, batch.format_report(results))
+        assert all(result['first_frame'].endswith('.0001.jpg') for result in results[:-1])
+        try:
+            batch.run_jobs([dict(jobs[0], resolution=None)], mayapy=mayapy)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('A job without resolution was started')
+    return run
+
+
+@case('profiles/restore')
+def profiles_restore(state, root_dir, size):
+    # every profile is applied around a playblast that raises, everything it changed must come back,
+    # in a batch worker the model panel is left alone
+    from maya_playblast import profiles
+    state.meshes = ['|body|bodyShape', '|head|headShape']
+
+    def check(name, batch):
+        state.batch = batch
+        state.model_editor = {}
+        state.attributes = dict(('{}.{}'.format(profiles.HARDWARE_RENDERING_NODE, attribute), 'initial')
+                                for attribute in profiles.PROFILES[name]['hardware_rendering'])
+        # the opposite of the profile smooth mesh preview, so it is changed
+        smooth = 0 if profiles.PROFILES[name]['smooth_mesh_preview'] else 1
+        state.attributes.update((mesh + '.displaySmoothMesh', smooth) for mesh in state.meshes)
+        initial = dict(state.attributes)
+        try:
+            with profiles.apply_profile(name):
+                assert state.attributes != initial, '{} changed nothing'.format(name)
+                assert bool(state.model_editor) != batch, '{} model editor, batch={}'.format(name, batch)
+                raise KeyboardInterrupt
+        except KeyboardInterrupt:
+            pass
+        assert state.attributes == initial, '{} left {}'.format(name, state.attributes)
+        assert all(value is True for value in state.model_editor.values()), \
+            '{} left the model editor at {}'.format(name, state.model_editor)
+
+    def run():
+        try:
+            for name in sorted(profiles.PROFILES):
+                check(name, batch=False)
+                check(name, batch=True)
+        finally:
+            state.batch = False
+            state.meshes = []
+            state.attributes = {}
+    return run
+
+
+@case('integrity/verify', sizes=(1000, 5000), quick_sizes=(1000,))
+def integrity_verify(state, root_dir, frame_count):
+    from maya_playblast import integrity
+    output_path = make_sequence(os.path.join(root_dir, 'frames', 'verify'), 'shot', frame_count,
+                                frame_bytes=200 * 1024)
+    return lambda: integrity.verify_sequence(output_path, 1, frame_count)
+
+
+@case('dedup/hash', sizes=(100, 1000), quick_sizes=(100,))
+def dedup_hash(state, root_dir, frame_count):
+    # 1 MB frames, the best throughput of the runs is reported
+    from maya_playblast import dedup
+    from maya_playblast.sequence import FrameSequence
+    output_path = make_sequence(os.path.join(root_dir, 'frames', 'dedup'), 'shot', frame_count,
+                                frame_bytes=1024 * 1024)
+    frames = FrameSequence.from_path(output_path + '.0001.jpg').paths()
+
+    def run():
+        start = time.time()
+        dedup.hash_frames(frames)
+        mb_per_s = round(frame_count / max(time.time() - start, 1e-6), 1)
+        run.metrics['mb_per_s'] = max(run.metrics.get('mb_per_s', 0), mb_per_s)
+    run.metrics = {}
+    return run
+
+
+@case('dedup/known_checksums', sizes=(100, 1000), quick_sizes=(100,))
+def dedup_known_checksums(state, root_dir, frame_count):
+    # the checksums.md5 of a staged blast lacks the last 10 frames, only those are hashed
+    from maya_playblast import dedup
+    output_path = make_sequence(os.path.join(root_dir, 'frames', 'known'), 'shot', frame_count,
+                                frame_bytes=1024 * 1024)
+    version_dir = os.path.dirname(output_path)
+    frames = [output_path + '.{:04d}.jpg'.format(frame) for frame in range(1, frame_count + 1)]
+    known = dict((path, dedup.hash_file(path)) for path in frames[:-10])
+
+    def run():
+        dedup.write_checksums(version_dir, known)
+        report = dedup.deduplicate(frames[0], previous=False)
+        assert report['hashed'] == 10, report
+        assert len(dedup.read_checksums(version_dir)) == frame_count
+        run.metrics['hashed'] = report['hashed']
+    run.metrics = {}
+    return run
+
+
+@case('retention/evict')
+def retention_evict(state, root_dir, size):
+    # v001 published, v002 pinned and v003 are 200 days old, v004 shares its frames (hardlinks) with v005,
+    # v005-v007 are the latest. Versions never expire, only v003 frees space under budget pressure
+    from maya_playblast import retention
+    flipbook_dir = os.path.join(root_dir, 'retention', 'flipbook')
+    temp_root = os.path.join(root_dir, 'retention', 'temp')
+    frame_count = 10
+    sequence_bytes = frame_count * 1028
+
+    def set_age(paths, days):
+        timestamp = time.time() - days * retention.DAY
+        for path in paths:
+            os.utime(path, (timestamp, timestamp))
+
+    def make_flipbook():
+        for directory in (flipbook_dir, temp_root):
+            if os.path.isdir(directory):
+                shutil.rmtree(directory)
+        for version in range(1, 8):
+            version_dir = os.path.join(flipbook_dir, 'v{:03d}'.format(version))
+            if version == 5:
+                os.makedirs(version_dir)
+                for name in os.listdir(os.path.join(flipbook_dir, 'v004')):
+                    os.link(os.path.join(flipbook_dir, 'v004', name), os.path.join(version_dir, name))
+            else:
+                make_sequence(version_dir, 'shot', frame_count, frame_bytes=1024)
+            if version < 4:
+                set_age([os.path.join(version_dir, name) for name in os.listdir(version_dir)] + [version_dir], 200)
+        retention.mark_published(os.path.join(flipbook_dir, 'v001'))
+        retention.pin(os.path.join(flipbook_dir, 'v002'))
+        os.makedirs(os.path.join(temp_root, 'tsk_1'))
+        for name, days in [('old.ma', 200), ('new.ma', 1), ('current.ma', 200)]:
+            with open(os.path.join(temp_root, 'tsk_1', name), 'wb') as f:
+                f.write(b'\0' * 1024)
+            set_age([os.path.join(temp_root, 'tsk_1', name)], days)
+
+    def versions(evicted):
+        return [entry['version'] for entry in evicted]
+
+    def run():
+        make_flipbook()
+        inodes = {}
+        entries = retention.get_version_entries(flipbook_dir, inodes)
+        protected = dict((entry['version'], entry['protected']) for entry in entries)
+        assert protected == {1: 'published', 2: 'pinned', 3: None, 4: None, 5: 'latest', 6: 'latest', 7: 'latest'}, \
+            protected
+        stats = dict((entry['version'], (entry['freed'], entry['bytes'])) for entry in entries)
+        assert stats[3] == (sequence_bytes, sequence_bytes), stats
+        # deleting v004 alone frees nothing, v005 still links its frames
+        assert stats[4] == (0, sequence_bytes), stats
+        assert retention.get_entry_stats(entries[2]['paths'] + entries[3]['paths'])[0] == sequence_bytes
+        used = sum(inodes.values())
+        # the shared frames count once, the markers are empty
+        assert used == 6 * sequence_bytes, (used, sum(entry['bytes'] for entry in entries))
+        assert retention.select_evictions(entries, used, used=used) == []
+        evicted = retention.select_evictions(entries, used - 1, used=used)
+        assert [(entry['version'], entry['reason']) for entry in evicted] == [(3, 'budget')], evicted
+        assert versions(retention.select_evictions(entries, 0, used=used)) == [3]
+        # under budget, only the expired temp scene goes, the one in use stays
+        keep = [os.path.join(temp_root, 'tsk_1', 'current.ma')]
+        reports = dict(retention.run(flipbook_dir, temp_root, keep=keep, flipbook_budget=used - 1,
+                                     temp_budget='1G'))
+        assert versions(reports['Flipbook versions']['evicted']) == [3]
+        assert sorted(os.listdir(flipbook_dir)) == ['v001', 'v002', 'v004', 'v005', 'v006', 'v007']
+        assert [entry['reason'] for entry in reports['Temp scenes']['evicted']] == ['age']
+        assert sorted(os.listdir(os.path.join(temp_root, 'tsk_1'))) == ['current.ma', 'new.ma']
+    return run
+
+
+@case('render_playblast/direct_to_network', sizes=(100, 500), quick_sizes=(100,))
+def render_direct_to_network(state, root_dir, frame_count):
+    return _render_to_network(state, root_dir, frame_count, staged=False)
+
+
+@case('render_playblast/staged', sizes=(100, 500), quick_sizes=(100,))
+def render_staged(state, root_dir, frame_count):
+    return _render_to_network(state, root_dir, frame_count, staged=True)
+
+
+def _render_to_network(state, root_dir, frame_count, staged):
+    # every file open on the network dir costs 2ms, cmds.playblast writes the 200 KB frames one after another
+    from maya_playblast import playblast
+    network_dir = os.path.join(root_dir, 'network')
+    scratch_dir = os.path.join(root_dir, 'scratch')
+    runs = []
+
+    def run():
+        runs.append(None)
+        output_path = os.path.join(network_dir, 'v{:03d}'.format(len(runs)), 'shot')
+        os.makedirs(os.path.dirname(output_path))
+        state.render_frames = True
+        state.frame_bytes = 200 * 1024
+        try:
+            with stubs.slow_filesystem(network_dir, 0.002):
+                playblast.render_playblast('shotCam', output_path, resolution=(1920, 1080), save_temp=False,
+                                           start_frame=1, end_frame=frame_count, staged=staged,
+                                           scratch_dir=scratch_dir)
+        finally:
+            state.render_frames = False
+        shutil.rmtree(os.path.dirname(output_path))
+    return run
+
+
+@case('output/jpeg_sequence', sizes=(100, 500), quick_sizes=(100,))
+def output_jpeg_sequence(state, root_dir, frame_count):
+    return _render_output(state, root_dir, frame_count, movie=False)
+
+
+@case('output/movie', sizes=(100, 500), quick_sizes=(100,))
+def output_movie(state, root_dir, frame_count):
+    return _render_output(state, root_dir, frame_count, movie=True)
+
+
+def _render_output(state, root_dir, frame_count, movie):
+    # 960x540 frames: 250 KB quality-100 JPEGs against the raw frames piped into the encoder,
+    # ffmpeg when it is on the PATH, the stubs.encoder_main stand-in (pipe and disk cost only) otherwise
+    from maya_playblast import movie as movie_module
+    from maya_playblast import playblast
+    encoder = movie_module.find_encoder() or [sys.executable, os.path.join(BENCH_DIR, 'stubs.py'), 'encoder']
+    output_dir = os.path.join(root_dir, 'output', 'movie' if movie else 'jpeg')
+
+    def run():
+        if os.path.isdir(output_dir):
+            shutil.rmtree(output_dir)
+        os.makedirs(output_dir)
+        state.render_frames = True
+        state.frame_bytes = 250 * 1024
+        try:
+            playblast.render_playblast('shotCam', os.path.join(output_dir, 'shot'), resolution=state.viewport_size,
+                                       save_temp=False, start_frame=1, end_frame=frame_count, movie=movie,
+                                       encoder=encoder)
+        finally:
+            state.render_frames = False
+        run.metrics['bytes_written'] = sum(os.path.getsize(os.path.join(output_dir, name))
+                                           for name in os.listdir(output_dir))
+    run.metrics = {}
+    return run
+
+
+@case('save_meta_data')
+def save_meta_data(state, root_dir, size):
+    from maya_playblast import playblast
+    output_path = make_sequence(os.path.join(root_dir, 'frames', 'meta'), 'shot', 10)
+    return lambda: playblast.save_meta_data(output_path + '.0001.jpg', refresh_meta=True)
+
+
+@case('save_meta_data/cached', sizes=(100, 1000), quick_sizes=(100,))
+def save_meta_data_cached(state, root_dir, texture_count):
+    # a collection costs 0.2s, the cache hit only fingerprints the texture_count file nodes
+    from maya_playblast import playblast
+    state.meta_collect_seconds = 0.2
+    state.file_nodes = ['file{}'.format(index) for index in range(texture_count)]
+    output_path = make_sequence(os.path.join(root_dir, 'frames', 'meta'), 'shot', 10)
+    playblast.save_meta_data(output_path + '.0001.jpg', refresh_meta=True, meta_cache=True)
+    return lambda: playblast.save_meta_data(output_path + '.0001.jpg', meta_cache=True)
+
+
+def run_cases(keyword=None, quick=False, repeat=5):
+    """
+    Returns
+    -------
+    dict
+        "<case>[<size>]" -> {"median": seconds, "min": seconds, "runs": repeat}
+    """
+    root_dir = tempfile.mkdtemp(prefix='maya_playblast_bench_')
+    os.environ['MAYA_PLAYBLAST_RUN_LOG'] = os.path.join(root_dir, 'run.log')
+    os.environ['MAYA_PLAYBLAST_TELEMETRY_LOG'] = os.path.join(root_dir, 'telemetry.log')
+    state = stubs.install(root_dir)
+    results = {}
+    stdout = sys.stdout
+    try:
+        for bench_case in CASES:
+            if keyword and keyword not in bench_case['name']:
+                continue
+            for size in (bench_case['quick_sizes'] if quick else bench_case['sizes']):
+                key = bench_case['name'] if size is None else '{}[{}]'.format(bench_case['name'], size)
+                # the stages print their progress, keep the report readable
+                sys.stdout = open(os.devnull, 'w')
+                try:
+                    function = bench_case['function'](state, root_dir, size)
+                    timings = []
+                    for _ in range(repeat):
+                        start = time.time()
+                        function()
+                        timings.append(time.time() - start)
+                finally:
+                    sys.stdout.close()
+                    sys.stdout = stdout
+                timings.sort()
+                results[key] = dict(median=timings[len(timings) // 2], min=timings[0], runs=repeat)
+                metrics = getattr(function, 'metrics', None) or {}
+                results[key].update(metrics)
+                print('{:<50} median {:>10.4f}s   min {:>10.4f}s{}'.format(
+                    key, results[key]['median'], results[key]['min'],
+                    ''.join('   {} {}'.format(name, value) for name, value in sorted(metrics.items()))))
+    finally:
+        shutil.rmtree(root_dir, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Returns
+    -------
+    list of str
+        one line per case slower than its baseline
+    """
+    regressions = []
+    for key, result in sorted(results.items()):
+        reference = baseline.get(key)
+        if reference and result['median'] > reference['median'] * (1 + tolerance) + ABSOLUTE_SLACK:
+            regressions.append('{}: {:.4f}s, baseline {:.4f}s'.format(key, result['median'], reference['median']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', '--keyword', help='only run the cases whose name contains this')
+    parser.add_argument('--quick', action='store_true', help='skip the largest sizes')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per case')
+    parser.add_argument('--output', default=DEFAULT_RESULTS, help='results JSON file')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed slowdown against the baseline, 0.5 = 50%%')
+    args = parser.parse_args(argv)
+
+    results = run_cases(args.keyword, args.quick, args.repeat)
+    report = dict(python=platform.python_version(), platform=platform.platform(), time=time.time(), results=results)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.isfile(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)['results']
+        baseline.update(results)
+        report['results'] = baseline
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print('Baseline saved to {}'.format(args.baseline))
+        return 0
+    if not os.path.isfile(args.baseline):
+        print('No baseline at {}, run with --save-baseline to create one'.format(args.baseline))
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f)['results'], args.tolerance)
+    for regression in regressions:
+        print('REGRESSION ' + regression)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,485 @@
+# coding=utf-8
+"""
+Fake maya.cmds / pymel / PySide2 / shotgun / resource_collector modules, just enough of them for the
+maya_playblast stages to run on a plain Python install.
+
+>>> state = stubs.install(root_dir)
+>>> from maya_playblast import playblast
+
+The stub behaviour is driven by the returned State: the scene size written by cmds.file(save=True),
+the simulated Shotgun latency, the modified flag...
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import contextlib
+import ctypes
+import os
+import runpy
+import sys
+import tempfile
+import time
+import types
+
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins
+
+
+class State(object):
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.scene_path = os.path.join(root_dir, 'scenes', 'shot_anim.ma')
+        self.current_name = self.scene_path
+        self.scene_bytes = 1024 * 1024
+        self.modified = True
+        self.min_time = 1001.0
+        self.max_time = 1100.0
+        self.sg_latency = 0.0
+        self.meta_collect_seconds = 0.0
+        # cmds.playblast writes the frames of the timeline range itself instead of returning the pattern only
+        self.render_frames = False
+        self.frame_bytes = 0
+        # file texture nodes of the scene, fingerprinted by the metadata cache
+        self.file_nodes = []
+        # playblast resolution of the benchmarks
+        self.viewport_size = (960, 540)
+        self.current_time = 1001.0
+        # cmds.about(batch=True), there is no model panel in batch mode
+        self.batch = False
+        # plug -> value, the plugs not set read as file texture paths
+        self.attributes = {}
+        self.meshes = []
+        self.model_editor = {}
+        # camera shapes, renderable: persp unless set in attributes
+        self.cameras = ['|persp|perspShape', '|shotCam|shotCamShape']
+        # callback id -> function of the 3d view post-render callbacks, called once per playblast frame
+        self.post_render = {}
+        self.blast_size = (0, 0)
+
+
+class Path(str):
+    """
+    The pymel Path bits used by maya_playblast
+    """
+
+    def basename(self):
+        return Path(os.path.basename(self))
+
+
+def _module(name, **attributes):
+    module = types.ModuleType(str(name))
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+
+def _make_cmds(state):
+
+    def file_(*args, **kwargs):
+        if kwargs.get('q') or kwargs.get('query'):
+            if kwargs.get('modified'):
+                return state.modified
+            if kwargs.get('sceneName'):
+                return state.current_name
+            return None
+        if 'rename' in kwargs:
+            state.current_name = kwargs['rename']
+        elif kwargs.get('save'):
+            directory = os.path.dirname(state.current_name)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(state.current_name, 'wb') as f:
+                f.write(b'\0' * state.scene_bytes)
+            state.modified = False
+        elif kwargs.get('modified'):
+            state.modified = True
+        elif kwargs.get('open'):
+            state.current_name = args[0]
+            _open_scene(args[0])
+
+    def playblast(*args, **kwargs):
+        if kwargs.get('activeEditor') or kwargs.get('ae'):
+            if state.batch:
+                raise RuntimeError('No active model panel in batch mode')
+            return 'modelPanel4'
+        if state.batch:
+            # the renderable camera is rendered, there must be a single one
+            renderable = [shape for shape in state.cameras if get_attr(shape + '.renderable')]
+            if len(renderable) != 1:
+                raise RuntimeError('{} renderable cameras in batch mode'.format(renderable or 'No'))
+        padding = kwargs.get('framePadding', 4)
+        extension = kwargs.get('compression', 'jpg')
+        percent = kwargs.get('percent', 100)
+        width_height = kwargs.get('widthHeight', state.viewport_size)
+        state.blast_size = tuple(int(value) * percent // 100 for value in width_height)
+        frames = range(int(kwargs.get('startTime', state.min_time)), int(kwargs.get('endTime', state.max_time)) + 1)
+        for frame in frames:
+            state.current_time = float(frame)
+            for callback in list(state.post_render.values()):
+                callback('modelPanel4')
+        # frames are usually laid out by the benchmark beforehand, only the pattern is returned
+        if state.render_frames:
+            payload = b'\xff\xd8' + b'\0' * state.frame_bytes + b'\xff\xd9'
+            for frame in frames:
+                with open('{}.{}.{}'.format(kwargs['filename'], str(frame).zfill(padding), extension), 'wb') as f:
+                    f.write(payload)
+        return '{}.{}.{}'.format(kwargs['filename'], '#' * padding, extension)
+
+    def playback_options(*args, **kwargs):
+        if kwargs.get('minTime'):
+            return state.min_time
+        if kwargs.get('maxTime'):
+            return state.max_time
+
+    def ls(*args, **kwargs):
+        nodes = {'file': state.file_nodes, 'mesh': state.meshes, 'camera': state.cameras}.get(kwargs.get('type'), [])
+        if args:
+            # the node itself, or the nodes below it with dag=True
+            nodes = [node for node in nodes if '|{}|'.format(args[0].strip('|')) in node + '|']
+        return nodes
+
+    def get_attr(plug, **kwargs):
+        if kwargs.get('lock'):
+            return False
+        if plug in state.attributes:
+            return state.attributes[plug]
+        if plug.endswith('.renderable'):
+            return plug.startswith('|persp|')
+        return os.path.join(state.root_dir, 'textures', plug.split('.')[0] + '.tif')
+
+    def set_attr(plug, value, **kwargs):
+        state.attributes[plug] = value
+
+    def model_editor(panel, **kwargs):
+        if state.batch:
+            raise RuntimeError('Object \'{}\' not found.'.format(panel))
+        flags = dict((flag, value) for flag, value in kwargs.items() if flag not in ('query', 'edit'))
+        if kwargs.get('query'):
+            return state.model_editor.get(list(flags)[0], True)
+        state.model_editor.update(flags)
+
+    def about(*args, **kwargs):
+        return state.batch if kwargs.get('batch') else True
+
+    def current_unit(*args, **kwargs):
+        return 'cm' if kwargs.get('linear') else 'film'
+
+    def current_time(*args, **kwargs):
+        if kwargs.get('q') or kwargs.get('query'):
+            return state.current_time
+        state.current_time = args[0]
+
+    return dict(file=file_, playblast=playblast, playbackOptions=playback_options, ls=ls, getAttr=get_attr,
+                setAttr=set_attr, modelEditor=model_editor, currentUnit=current_unit,
+                pluginInfo=lambda *args, **kwargs: ['mtoa', 'AbcImport'], currentTime=current_time, about=about,
+                progressWindow=lambda *args, **kwargs: False)
+
+
+def _open_scene(scene_path):
+    """
+    A scene opened by a batch worker may hold a behaviour instead of a scene: "hang" never returns,
+    "fail_once" raises on the first open only
+    """
+    with open(scene_path, 'rb') as f:
+        behaviour = f.read().strip()
+    if behaviour == b'hang':
+        time.sleep(60 * 60)
+    elif behaviour == b'fail_once':
+        marker_path = scene_path + '.failed'
+        if not os.path.exists(marker_path):
+            open(marker_path, 'w').close()
+            raise RuntimeError('{} failed to open'.format(scene_path))
+
+
+def _make_api(state):
+    """
+    maya.api.OpenMaya.MImage and MMessage, maya.api.OpenMayaUI.M3dView and MUiMessage: the playblast frames read
+    back from the view as a RGBA buffer by a post-render callback
+    """
+
+    class MImage(object):
+
+        def __init__(self):
+            self.size = (0, 0)
+            self.buffer = ctypes.create_string_buffer(0)
+
+        def create(self, width, height):
+            if (width, height) != self.size:
+                self.size = (width, height)
+                self.buffer = ctypes.create_string_buffer(width * height * 4)
+
+        def getSize(self):
+            # a list, as in API 2.0
+            return list(self.size)
+
+        def resize(self, width, height, preserve_aspect_ratio=True):
+            self.create(width, height)
+
+        def pixels(self):
+            return ctypes.addressof(self.buffer)
+
+        def writeToFile(self, path, output_format='iff'):
+            with open(path, 'wb') as f:
+                f.write(b'\xff\xd8' + b'\0' * state.frame_bytes + b'\xff\xd9')
+
+    class M3dView(object):
+
+        @staticmethod
+        def getM3dViewFromModelPanel(panel):
+            return M3dView()
+
+        def readColorBuffer(self, image, read_rgba=False):
+            image.create(*state.blast_size)
+
+    class MUiMessage(object):
+
+        @staticmethod
+        def add3dViewPostRenderMsgCallback(panel, function, client_data=None):
+            callback_id = object()
+            state.post_render[callback_id] = function
+            return callback_id
+
+    class MMessage(object):
+
+        @staticmethod
+        def removeCallback(callback_id):
+            del state.post_render[callback_id]
+
+    return {'MImage': MImage, 'MMessage': MMessage}, {'M3dView': M3dView, 'MUiMessage': MUiMessage}
+
+
+def mayapy_main(argv=None):
+    """
+    mayapy stand-in for the batch benchmarks: the stubs are installed and cmds.playblast writes the frames.
+
+        python benchmarks/stubs.py mayapy -m maya_playblast.batch --worker job.json result.json
+    """
+    argv = list(argv or sys.argv[2:])
+    state = install(os.environ.get('MAYA_PLAYBLAST_STUB_ROOT') or tempfile.mkdtemp(prefix='maya_playblast_stub_'))
+    state.render_frames = True
+    state.batch = True
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sys.argv = [argv[1]] + argv[2:]
+    try:
+        runpy.run_module(argv[1], run_name='__main__', alter_sys=True)
+    except SystemExit as e:
+        return e.code
+    return 0
+
+
+class _ImportRecorder(object):
+    """
+    Meta path finder refusing the hidden modules and recording the attempts to import them
+    """
+
+    def __init__(self, names):
+        self.names = set(names)
+        self.imported = []
+
+    def _refuse(self, fullname):
+        if fullname in self.names:
+            self.imported.append(fullname)
+            raise ImportError('{} is not allowed here'.format(fullname))
+
+    def find_spec(self, fullname, path=None, target=None):
+        self._refuse(fullname)
+
+    def find_module(self, fullname, path=None):
+        self._refuse(fullname)
+
+
+def import_main(argv=None):
+    """
+    Cold import of a module in this fresh interpreter, printed as JSON: seconds, and the hidden modules it tried
+    to import (the stub modules are installed, the hidden ones are taken out again).
+
+        python benchmarks/stubs.py import maya_playblast.dialog pymel.core resource_collector
+    """
+    import json
+    argv = list(argv or sys.argv[2:])
+    module_name, hidden = argv[0], argv[1:]
+    install(tempfile.mkdtemp(prefix='maya_playblast_stub_'))
+    for name in list(sys.modules):
+        if any(name == hidden_name or name.startswith(hidden_name + '.') for hidden_name in hidden):
+            del sys.modules[name]
+    for hidden_name in hidden:
+        # a stub parent module becomes a package, so importing the hidden child goes through the finders
+        parent = sys.modules.get(hidden_name.rpartition('.')[0])
+        if parent is not None and not hasattr(parent, '__path__'):
+            parent.__path__ = []
+    recorder = _ImportRecorder(hidden)
+    sys.meta_path.insert(0, recorder)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    error = None
+    start = time.time()
+    try:
+        __import__(module_name)
+    except ImportError as e:
+        error = str(e)
+    seconds = time.time() - start
+    sys.stdout.write(json.dumps(dict(seconds=seconds, imported=sorted(set(recorder.imported)), error=error)) + '\n')
+    return 0
+
+
+def encoder_main(argv=None):
+    """
+    ffmpeg stand-in for the movie benchmarks: reads the raw frames from stdin and writes a movie of a 100th
+    of their size to the last argument, as an x264 encode of a viewport roughly does.
+
+        python benchmarks/stubs.py encoder <ffmpeg arguments> output.mp4
+    """
+    output = (argv or sys.argv)[-1]
+    stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+    with open(output, 'wb') as f:
+        for block in iter(lambda: stdin.read(1024 * 1024), b''):
+            f.write(b'\0' * (len(block) // 100))
+    return 0
+
+
+class _Env(object):
+
+    def __init__(self, state):
+        self.__dict__['_state'] = state
+
+    @property
+    def minTime(self):
+        return self._state.min_time
+
+    @property
+    def maxTime(self):
+        return self._state.max_time
+
+    def __setattr__(self, name, value):
+        setattr(self._state, {'minTime': 'min_time', 'maxTime': 'max_time'}[name], value)
+
+
+class _Panel(object):
+
+    def getCamera(self):
+        return 'shotCam'
+
+
+class _SlowAttribute(object):
+    """
+    Shotgun entity field: every read costs the simulated Shotgun latency
+    """
+
+    def __init__(self, state, value):
+        self.state = state
+        self.value = value
+
+    def __get__(self, instance, owner):
+        time.sleep(self.state.sg_latency)
+        return self.value
+
+
+@contextlib.contextmanager
+def slow_filesystem(root_dir, latency):
+    """
+    Network filesystem stand-in: every open() of a file under root_dir waits latency seconds first,
+    the round trip a NFS open/create costs. The wait releases the GIL like real I/O does.
+    """
+    root_dir = os.path.normpath(root_dir) + os.sep
+    original_open = builtins.open
+
+    def slow_open(file, *args, **kwargs):
+        if isinstance(file, (str, type(''))) and os.path.abspath(file).startswith(root_dir):
+            time.sleep(latency)
+        return original_open(file, *args, **kwargs)
+
+    builtins.open = slow_open
+    try:
+        yield
+    finally:
+        builtins.open = original_open
+
+
+def install(root_dir):
+    """
+    Put the fake modules into sys.modules
+
+    Parameters
+    ----------
+    root_dir: str
+        scratch directory for the scene, the temp dir and the flipbook user dir
+
+    Returns
+    -------
+    State
+    """
+    state = State(root_dir)
+    cmds = _module('maya.cmds', **_make_cmds(state))
+    open_maya, open_maya_ui = _make_api(state)
+    open_maya = _module('maya.api.OpenMaya', **open_maya)
+    open_maya_ui = _module('maya.api.OpenMayaUI', **open_maya_ui)
+    api = _module('maya.api', OpenMaya=open_maya, OpenMayaUI=open_maya_ui)
+    standalone = _module('maya.standalone', initialize=lambda name='python': None, uninitialize=lambda: None)
+    _module('maya', cmds=cmds, api=api, standalone=standalone)
+
+    lookthru = {'camera': 'persp'}
+
+    def look_thru(*args, **kwargs):
+        if state.batch:
+            raise RuntimeError('No model panel to look through in batch mode')
+        if kwargs.get('q'):
+            return lookthru['camera']
+        lookthru['camera'] = args[0]
+
+    ui = types.ModuleType(str('pymel.core.uitypes'))
+    ui.PyUI = lambda name: _Panel()
+    core = _module('pymel.core',
+                   env=_Env(state),
+                   lookThru=look_thru,
+                   sceneName=lambda: Path(state.current_name),
+                   playblast=cmds.playblast,
+                   PyNode=lambda name: name,
+                   hasAttr=lambda node, attribute: False,
+                   getAttr=lambda plug: None,
+                   ui=ui)
+    _module('pymel', core=core)
+
+    qt_widgets = _module('PySide2.QtWidgets', QMessageBox=object, QDialog=object, QWidget=object)
+    qt_core = _module('PySide2.QtCore', Signal=lambda *args: None, Qt=types.ModuleType(str('Qt')))
+    _module('PySide2', QtWidgets=qt_widgets, QtCore=qt_core)
+
+    task_type = type(str('Task'), (object,), dict(
+        id=1234,
+        entity=type(str('Entity'), (object,), dict(full_name=_SlowAttribute(state, 'ep01_sq010_sh0100')))(),
+        step=type(str('Step'), (object,), dict(short_name=_SlowAttribute(state, 'anim')))()))
+    project_type = type(str('Project'), (object,), dict(
+        id=42, sg_dailies_resolution=_SlowAttribute(state, '1920x1080')))
+    context = types.ModuleType(str('shotgun.context'))
+    context.task = task_type()
+    context.project = project_type()
+    context.entity = types.ModuleType(str('entity'))
+    context.entity.id = 5678
+    context.USER_TEMPDIR = os.path.join(root_dir, 'temp')
+    context.get_userdir = lambda name: os.path.join(root_dir, 'user', name)
+    _module('shotgun', context=context, SG_Shot=None)
+
+    class MayaResourceCollector(object):
+
+        def __init__(self, resource_path, **kwargs):
+            self.resource_path = resource_path
+
+        def collect(self, **kwargs):
+            time.sleep(state.meta_collect_seconds)
+            return dict(resource_path=self.resource_path, references=[], textures=list(state.file_nodes))
+
+        def write(self, data):
+            pass
+
+    collector = _module('resource_collector.maya_resource_collector', MayaResourceCollector=MayaResourceCollector)
+    _module('resource_collector', maya_resource_collector=collector)
+    return state
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['encoder']:
+        sys.exit(encoder_main())
+    if sys.argv[1:2] == ['mayapy']:
+        sys.exit(mayapy_main())
+    if sys.argv[1:2] == ['import']:
+        sys.exit(import_main())
@@ -4,9 +4,26 @@ Usage:
 
 >>> import maya_playblast
 >>> maya_playblast.show()
+
+Headless batch playblasts (see maya_playblast.batch):
+
+$ python -m maya_playblast jobs.json --workers 4
 """
 from __future__ import absolute_import
-import pymel.core as pm
+
+
+def get_maya_window():
+    """
+    Maya main window, looked up through OpenMayaUI so opening the dialog doesn't need pymel
+
+    Returns
+    -------
+    QtWidgets.QWidget
+    """
+    from maya import OpenMayaUI
+    from PySide2.QtWidgets import QWidget
+    from shiboken2 import wrapInstance
+    return wrapInstance(int(OpenMayaUI.MQtUtil.mainWindow()), QWidget)
 
 
 def close_and_delete_all_children(parent, child_py_type_object, child_object_name):
@@ -16,13 +33,25 @@ def close_and_delete_all_children(parent, child_py_type_object, child_object_nam
         child.deleteLater()
 
 
-def show():
+def show(refresh_cache=False):
     """
     Maya Playblast dialog open
+
+    Parameters
+    ----------
+    refresh_cache: bool
+        drop the cached Shotgun data and metadata of the current task and look them up again
     """
     from . import dialog
+    from . import sg_cache
+    if refresh_cache:
+        sg_cache.invalidate()
+        from . import meta_cache
+        meta_cache.invalidate()
+    # Shotgun lookups run in the background while the dialog is built
+    sg_cache.prefetch()
     from PySide2.QtWidgets import QDialog
-    maya_window_object = pm.ui.PyUI('MayaWindow').asQtObject()
+    maya_window_object = get_maya_window()
     close_and_delete_all_children(maya_window_object, QDialog, 'PlayblastWindow')
     # create a new window
     maya_playblast_window = dialog.MBlastUI(parent=maya_window_object)
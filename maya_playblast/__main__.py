@@ -0,0 +1,8 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import sys
+
+from maya_playblast.batch import main
+
+sys.exit(main())
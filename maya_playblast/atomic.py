@@ -0,0 +1,58 @@
+# coding=utf-8
+"""
+Atomic file replacement for the small state files (version index, journals, caches): the content is written to a
+unique temp file next to the target and renamed over it, so a reader sees the old file or the new one, never
+a partial write, and concurrent writers don't clobber each other's temp files.
+
+>>> atomic.write_file(path, lambda f: json.dump(data, f))
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import os
+import uuid
+
+
+def replace_file(source, destination):
+    """
+    Rename source over destination, atomically where the platform allows it
+    """
+    if hasattr(os, 'replace'):
+        # atomic on Windows as well
+        os.replace(source, destination)
+        return
+    try:
+        os.rename(source, destination)
+    except OSError:
+        # Windows can't rename over an existing file
+        if not os.path.exists(destination):
+            raise
+        os.remove(destination)
+        os.rename(source, destination)
+
+
+def write_file(path, write, mode='w'):
+    """
+    Replace path with the content written by write(f), the temp file is removed when it fails
+
+    Parameters
+    ----------
+    path: str
+    write: callable
+        takes the open temp file
+    mode: str
+        "w" or "wb"
+
+    Raises
+    ------
+    IOError, OSError
+        and whatever write raises
+    """
+    temp_path = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    try:
+        with open(temp_path, mode) as f:
+            write(f)
+        replace_file(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -0,0 +1,323 @@
+# coding=utf-8
+"""
+Headless batch playblasts driven by a job spec.
+
+Usage:
+
+    python -m maya_playblast jobs.json --workers 4 --timeout 1800 --retries 1
+
+The job spec is a JSON (or YAML, if PyYAML is installed) list of jobs, or a dict with a "jobs" list:
+
+    [{"scene": "/path/to/shot.ma", "camera": "shotCam", "start_frame": 1001, "end_frame": 1100,
+      "resolution": "1920x1080", "output_path": "/path/to/flipbook/v001/shot_anim_v001"}]
+
+The scheduler only needs the standard library, so it runs on any box. Every job is rendered by a separate
+mayapy process started as ``mayapy -m maya_playblast.batch --worker <job.json> <result.json>``.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing.pool import ThreadPool
+
+MAYAPY = os.environ.get('MAYAPY', 'mayapy')
+DEFAULT_WORKERS = 2
+DEFAULT_TIMEOUT = 60 * 60
+DEFAULT_RETRIES = 1
+POLL_INTERVAL = 0.5
+# optional job keys passed straight to render_playblast
+RENDER_OPTIONS = ('frame_padding', 'compression', 'quality', 'percent', 'show_ornaments', 'profile')
+# the directory containing the maya_playblast package, so workers can import it
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_subprocess_env():
+    """
+    The environment of the mayapy and python subprocesses running the maya_playblast modules (batch workers,
+    stream watchers, post jobs), with PACKAGE_ROOT first on the PYTHONPATH
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [PACKAGE_ROOT, env.get('PYTHONPATH')]))
+    return env
+
+
+def load_jobs(spec_path):
+    """
+    Read the job list from a JSON or YAML file
+
+    Parameters
+    ----------
+    spec_path: str
+
+    Returns
+    -------
+    list of dict
+    """
+    with open(spec_path) as f:
+        text = f.read()
+    if os.path.splitext(spec_path)[1].lower() in ('.yaml', '.yml'):
+        import yaml
+        data = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get('jobs', [])
+    return [normalize_job(job, index) for index, job in enumerate(data)]
+
+
+def normalize_job(job, index=0):
+    """
+    Validate a single job entry and fill in its defaults.
+    The resolution and the frame range are required: a worker has no viewport to take them from, a job without
+    them would only fail inside mayapy, once per retry.
+
+    Parameters
+    ----------
+    job: dict
+    index: int
+        position of the job in the spec, used for the default job name
+
+    Returns
+    -------
+    dict
+    """
+    for key in ('scene', 'camera', 'output_path', 'resolution'):
+        if not job.get(key):
+            raise ValueError('Job #{} has no "{}"'.format(index, key))
+    for key in ('start_frame', 'end_frame'):
+        if job.get(key) is None:
+            raise ValueError('Job #{} has no "{}"'.format(index, key))
+    job = dict(job)
+    resolution = job['resolution']
+    if not isinstance(resolution, (list, tuple)):
+        resolution = str(resolution).lower().split('x')
+    try:
+        resolution = [int(float(value)) for value in resolution]
+    except ValueError:
+        resolution = []
+    if len(resolution) != 2 or min(resolution) <= 0:
+        raise ValueError('Job #{} has an invalid resolution "{}"'.format(index, job['resolution']))
+    job['resolution'] = resolution
+    if float(job['end_frame']) < float(job['start_frame']):
+        raise ValueError('Job #{} ends before it starts: {}-{}'.format(index, job['start_frame'], job['end_frame']))
+    job.setdefault('name', '{:03d}_{}_{}'.format(index, os.path.splitext(os.path.basename(job['scene']))[0],
+                                                  job['camera'].split('|')[-1]))
+    return job
+
+
+def run_job(job, mayapy=MAYAPY, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, log_dir=None):
+    """
+    Render a single job in its own mayapy process, retrying failed or timed out attempts
+
+    Parameters
+    ----------
+    job: dict
+    mayapy: str or list
+        mayapy executable (or any python interpreter able to import maya.standalone), or a command prefix
+    timeout: float
+        seconds an attempt may run before it is killed, overridden by job["timeout"]
+    retries: int
+        extra attempts after the first failure, overridden by job["retries"]
+    log_dir: str
+        directory for the job, result and worker log files
+
+    Returns
+    -------
+    dict
+        name, status ("ok", "failed" or "timeout"), attempts, seconds, first_frame, error, log
+    """
+    timeout = job.get('timeout', timeout)
+    retries = job.get('retries', retries)
+    log_dir = log_dir or tempfile.mkdtemp(prefix='maya_playblast_batch_')
+    if not os.path.isdir(log_dir):
+        try:
+            os.makedirs(log_dir)
+        except OSError:
+            # created by another job of the pool in the meantime
+            if not os.path.isdir(log_dir):
+                raise
+    job_path = os.path.join(log_dir, job['name'] + '.job.json')
+    result_path = os.path.join(log_dir, job['name'] + '.result.json')
+    log_path = os.path.join(log_dir, job['name'] + '.log')
+    with open(job_path, 'w') as f:
+        json.dump(job, f, indent=2)
+
+    env = get_subprocess_env()
+    command = (list(mayapy) if isinstance(mayapy, (list, tuple)) else [mayapy]) \
+        + ['-m', 'maya_playblast.batch', '--worker', job_path, result_path]
+
+    result = dict(name=job['name'], status='failed', attempts=0, first_frame=None, error=None, log=log_path)
+    start_time = time.time()
+    while result['attempts'] <= retries:
+        result['attempts'] += 1
+        if os.path.exists(result_path):
+            os.remove(result_path)
+        logging.info('Job {} attempt {}: {}'.format(job['name'], result['attempts'], ' '.join(command)))
+        with open(log_path, 'a') as log_file:
+            try:
+                process = subprocess.Popen(command, stdout=log_file, stderr=subprocess.STDOUT, env=env)
+            except OSError as e:
+                result['error'] = 'Can`t start {}: {}'.format(mayapy, e)
+                break
+            attempt_start = time.time()
+            timed_out = False
+            while process.poll() is None:
+                if timeout and time.time() - attempt_start > timeout:
+                    process.kill()
+                    process.wait()
+                    timed_out = True
+                    break
+                time.sleep(POLL_INTERVAL)
+        if timed_out:
+            result['status'] = 'timeout'
+            result['error'] = 'Timed out after {}s'.format(timeout)
+            continue
+        worker_result = {}
+        if os.path.exists(result_path):
+            with open(result_path) as f:
+                worker_result = json.load(f)
+        if process.returncode == 0 and worker_result.get('first_frame'):
+            result['status'] = 'ok'
+            result['first_frame'] = worker_result['first_frame']
+            result['error'] = None
+            break
+        result['status'] = 'failed'
+        result['error'] = worker_result.get('error') or 'Worker exited with code {}'.format(process.returncode)
+    result['seconds'] = round(time.time() - start_time, 2)
+    return result
+
+
+def run_jobs(jobs, workers=DEFAULT_WORKERS, **kwargs):
+    """
+    Spread the jobs over a bounded pool of mayapy worker processes, every job is validated before the first starts
+
+    Parameters
+    ----------
+    jobs: list of dict
+    workers: int
+        maximum number of mayapy processes running at once
+    kwargs
+        passed to run_job
+
+    Returns
+    -------
+    list of dict
+        run_job results in the order of the jobs
+    """
+    if not jobs:
+        return []
+    jobs = [normalize_job(job, index) for index, job in enumerate(jobs)]
+    pool = ThreadPool(max(1, min(workers, len(jobs))))
+    try:
+        return pool.map(lambda job: run_job(job, **kwargs), jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def format_report(results):
+    """
+    Human readable summary of run_jobs results
+
+    Parameters
+    ----------
+    results: list of dict
+
+    Returns
+    -------
+    str
+    """
+    lines = []
+    for result in results:
+        line = '{status:<8} {name}  ({attempts} attempt(s), {seconds}s)'.format(**result)
+        if result['status'] == 'ok':
+            line += '\n         {}'.format(result['first_frame'])
+        else:
+            line += '\n         {}\n         log: {}'.format(result['error'], result['log'])
+        lines.append(line)
+    succeeded = len([r for r in results if r['status'] == 'ok'])
+    lines.append('# batch playblast | {} of {} job(s) succeeded'.format(succeeded, len(results)))
+    return '\n'.join(lines)
+
+
+def run_worker(job_path, result_path):
+    """
+    mayapy side of a job: open the scene and render the playblast
+
+    Parameters
+    ----------
+    job_path: str
+    result_path: str
+        where the first frame path or the error is written for the scheduler
+    """
+    import maya.standalone
+    maya.standalone.initialize(name='python')
+    result = {}
+    try:
+        from maya import cmds
+        from . import playblast
+        with open(job_path) as f:
+            job = json.load(f)
+        cmds.file(job['scene'], open=True, force=True)
+        output_dir = os.path.dirname(job['output_path'])
+        if output_dir and not os.path.isdir(output_dir):
+            try:
+                os.makedirs(output_dir)
+            except OSError:
+                # another worker of the same sequence got there first
+                if not os.path.isdir(output_dir):
+                    raise
+        render_options = dict((key, job[key]) for key in RENDER_OPTIONS if key in job)
+        result['first_frame'] = playblast.render_playblast(job['camera'], job['output_path'],
+                                                           resolution=job.get('resolution'),
+                                                           start_frame=job.get('start_frame'),
+                                                           end_frame=job.get('end_frame'),
+                                                           save_temp=False,
+                                                           **render_options)
+        if not result['first_frame']:
+            result['error'] = 'Playblast produced no frames'
+    except Exception as e:
+        logging.exception('Batch playblast failed')
+        result['error'] = str(e)
+    with open(result_path, 'w') as f:
+        json.dump(result, f)
+    maya.standalone.uninitialize()
+    return 0 if result.get('first_frame') else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='maya_playblast', description='Headless batch playblasts')
+    parser.add_argument('spec', nargs='?', help='JSON/YAML job list')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='parallel mayapy processes')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='seconds per job attempt')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES, help='extra attempts per failed job')
+    parser.add_argument('--mayapy', default=MAYAPY, help='mayapy executable')
+    parser.add_argument('--log-dir', help='directory for job logs')
+    parser.add_argument('--report', help='write the results as JSON to this file')
+    parser.add_argument('--worker', nargs=2, metavar=('JOB', 'RESULT'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.worker:
+        return run_worker(*args.worker)
+    if not args.spec:
+        parser.error('a job spec is required')
+
+    jobs = load_jobs(args.spec)
+    results = run_jobs(jobs, workers=args.workers, mayapy=args.mayapy, timeout=args.timeout,
+                       retries=args.retries, log_dir=args.log_dir or tempfile.mkdtemp(prefix='maya_playblast_batch_'))
+    sys.stdout.write(format_report(results) + '\n')
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0 if all(result['status'] == 'ok' for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+# coding=utf-8
+"""
+Chunked playblasts: one long frame range is split into sub-ranges which are rendered in parallel
+by mayapy workers (see maya_playblast.batch) from the temp scene, all into the same image sequence.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import logging
+import os
+import sys
+
+from maya import cmds
+
+from . import batch
+from . import integrity
+from . import playblast
+from . import telemetry
+
+DEFAULT_CHUNK_WORKERS = 4
+
+
+def split_frame_range(start_frame, end_frame, chunk_size=None, chunks=None):
+    """
+    Cut start_frame..end_frame (inclusive) into contiguous, non-overlapping sub-ranges
+
+    Parameters
+    ----------
+    start_frame: int
+    end_frame: int
+    chunk_size: int
+        frames per sub-range
+    chunks: int
+        number of sub-ranges, used when chunk_size is not given
+
+    Returns
+    -------
+    list of tuple
+        (start, end) pairs, both inclusive
+    """
+    start_frame, end_frame = int(start_frame), int(end_frame)
+    frame_count = end_frame - start_frame + 1
+    if frame_count < 1:
+        raise ValueError('Invalid frame range {}-{}'.format(start_frame, end_frame))
+    if not chunk_size:
+        chunks = max(1, min(chunks or 1, frame_count))
+        # spread the remainder over the first chunks so sizes differ by one frame at most
+        chunk_size, remainder = divmod(frame_count, chunks)
+        sizes = [chunk_size + 1] * remainder + [chunk_size] * (chunks - remainder)
+    else:
+        sizes = [chunk_size] * (frame_count // chunk_size)
+        if frame_count % chunk_size:
+            sizes.append(frame_count % chunk_size)
+    ranges = []
+    chunk_start = start_frame
+    for size in sizes:
+        ranges.append((chunk_start, chunk_start + size - 1))
+        chunk_start += size
+    return ranges
+
+
+def check_sequence(output_path, start_frame, end_frame, ranges, frame_padding=4, extension='jpg'):
+    """
+    Make sure the chunks cover the whole range exactly once and every frame was written
+
+    Parameters
+    ----------
+    output_path: str
+        sequence base path, without frame number and extension
+    start_frame: int
+    end_frame: int
+    ranges: list of tuple
+    frame_padding: int
+    extension: str
+
+    Returns
+    -------
+    list of int
+        missing, empty or truncated frames, empty when the sequence is complete
+
+    Raises
+    ------
+    ValueError
+        if the chunk ranges have gaps or overlap
+    """
+    expected_start = start_frame
+    for chunk_start, chunk_end in sorted(ranges):
+        if chunk_start < expected_start:
+            raise ValueError('Chunk {}-{} overlaps the previous one'.format(chunk_start, chunk_end))
+        if chunk_start > expected_start:
+            raise ValueError('Frames {}-{} are not covered by any chunk'.format(expected_start, chunk_start - 1))
+        expected_start = chunk_end + 1
+    if expected_start != end_frame + 1:
+        raise ValueError('Chunks end at {} instead of {}'.format(expected_start - 1, end_frame))
+    report = integrity.verify_sequence(output_path, start_frame, end_frame, frame_padding, extension)
+    return integrity.get_bad_frames(report)
+
+
+def render_chunked(render_camera, output_path, resolution=None, **kwargs):
+    """
+    Drop-in replacement for playblast.render_playblast rendering the frame range in parallel chunks
+
+    Parameters
+    ----------
+    render_camera
+    output_path: str
+    resolution: tuple
+    kwargs
+        chunk_size, chunks, chunk_workers, chunk_timeout, chunk_retries and the render_playblast options
+
+    Returns
+    -------
+    str
+        first frame path, as render_playblast returns it
+    """
+    start_frame = kwargs.get('start_frame')
+    end_frame = kwargs.get('end_frame')
+    if start_frame is None or end_frame is None:
+        start_frame = cmds.playbackOptions(q=True, minTime=True)
+        end_frame = cmds.playbackOptions(q=True, maxTime=True)
+    start_frame, end_frame = int(start_frame), int(end_frame)
+    frame_padding = kwargs.get('frame_padding', 4)
+    compression = kwargs.get('compression', 'jpg')
+    workers = kwargs.get('chunk_workers') or DEFAULT_CHUNK_WORKERS
+
+    # the workers open the temp scene, so it is always saved here
+    with telemetry.span('temp_save'):
+        temp_scene_path = playblast.save_temp_scene()
+    if not temp_scene_path:
+        raise RuntimeError('Temp Scene not created, can`t render in chunks.')
+    playblast.temp_data['temp_scene'] = temp_scene_path
+    sys.stdout.write('Temp Scene saved to:\n{}\n'.format(temp_scene_path))
+
+    # workers have no UI to query, resolve the resolution once here
+    resolution = resolution \
+        or playblast.get_dailies_resolution_from_camera() or playblast.get_dailies_resolution_from_sg()
+
+    ranges = split_frame_range(start_frame, end_frame,
+                               chunk_size=kwargs.get('chunk_size'),
+                               chunks=kwargs.get('chunks') or (None if kwargs.get('chunk_size') else workers))
+    output_dir = os.path.dirname(output_path)
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    jobs = []
+    for chunk_start, chunk_end in ranges:
+        job = dict(name='{}_{}-{}'.format(os.path.basename(output_path), chunk_start, chunk_end),
+                   scene=temp_scene_path,
+                   camera=str(render_camera),
+                   output_path=output_path,
+                   start_frame=chunk_start,
+                   end_frame=chunk_end,
+                   resolution=list(resolution))
+        for key in batch.RENDER_OPTIONS:
+            if key in kwargs:
+                job[key] = kwargs[key]
+        jobs.append(job)
+
+    sys.stdout.write('# playblast | rendering {} frames in {} chunks on {} workers to:\n{}\n'.format(
+        end_frame - start_frame + 1, len(jobs), workers, output_path))
+    with telemetry.span('render', chunks=len(jobs), workers=workers):
+        results = batch.run_jobs(jobs, workers=workers,
+                                 timeout=kwargs.get('chunk_timeout', batch.DEFAULT_TIMEOUT),
+                                 retries=kwargs.get('chunk_retries', batch.DEFAULT_RETRIES))
+    failed = [result for result in results if result['status'] != 'ok']
+    if failed:
+        logging.error(batch.format_report(failed))
+        raise RuntimeError('{} of {} playblast chunks failed'.format(len(failed), len(results)))
+
+    with telemetry.span('verify'):
+        broken = check_sequence(output_path, start_frame, end_frame, ranges, frame_padding, compression)
+    if broken:
+        raise RuntimeError('Chunked playblast has {} missing or broken frame(s): {}'.format(
+            len(broken), ', '.join(str(frame) for frame in broken[:20])))
+
+    first_frame_path = playblast.get_frame_path(output_path, start_frame, frame_padding, compression)
+    sys.stdout.write('# playblast | first frame path:\n{}\n'.format(first_frame_path))
+    return first_frame_path.replace('\\', '/')
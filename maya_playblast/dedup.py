@@ -0,0 +1,176 @@
+# coding=utf-8
+"""
+Content-hash deduplication of the rendered frames.
+
+Held poses render to identical frames, so after a playblast the frames are hashed in parallel and the duplicates
+are replaced by hardlinks, within the version and against the closest older version. The md5 of every frame is
+kept in the checksums.md5 of the version (the format of stream.ChecksumConsumer), so the next version does not
+hash this one again. The frames already in it (staged blasts, the checksum stream consumer) are not hashed either.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import hashlib
+import logging
+import os
+import re
+import sys
+import time
+from multiprocessing.pool import ThreadPool
+
+from . import atomic
+from .sequence import FrameSequence
+from .versions import get_previous_version_dir
+from .stream import CHECKSUM_FILE_NAME
+
+DEFAULT_WORKERS = 8
+BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def hash_frames(paths, workers=None):
+    """
+    Parameters
+    ----------
+    paths: list of str
+    workers: int
+
+    Returns
+    -------
+    dict
+        path -> md5
+    """
+    if not paths:
+        return {}
+    pool = ThreadPool(min(workers or DEFAULT_WORKERS, len(paths)))
+    try:
+        return dict(zip(paths, pool.map(hash_file, paths)))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def read_checksums(version_dir):
+    """
+    The checksums.md5 of a version, path -> md5
+    """
+    checksums = {}
+    try:
+        with open(os.path.join(version_dir, CHECKSUM_FILE_NAME)) as f:
+            for line in f:
+                md5, _, name = line.strip().partition('  ')
+                if name:
+                    checksums[os.path.join(version_dir, name)] = md5
+    except (IOError, OSError):
+        pass
+    return checksums
+
+
+def write_checksums(version_dir, checksums):
+    with open(os.path.join(version_dir, CHECKSUM_FILE_NAME), 'w') as f:
+        for path in sorted(checksums):
+            f.write('{}  {}\n'.format(checksums[path], os.path.basename(path)))
+
+
+def _same_file(path, other_path):
+    path_stat, other_stat = os.stat(path), os.stat(other_path)
+    return path_stat.st_ino == other_stat.st_ino and path_stat.st_dev == other_stat.st_dev
+
+
+def _replace_with_link(source, path):
+    temp_path = path + '.dedup'
+    os.link(source, temp_path)
+    atomic.replace_file(temp_path, path)
+
+
+def deduplicate(first_frame_path, previous=True, workers=None, sequence=None):
+    """
+    Hardlink the identical frames of the sequence
+
+    Parameters
+    ----------
+    first_frame_path: str
+    previous: bool
+        also link to the identical frames of the closest older version
+    workers: int
+    sequence: FrameSequence
+        the frames of first_frame_path when already known, the directory is listed otherwise
+
+    Returns
+    -------
+    dict
+        frames, hashed, unique (distinct contents), linked (frames replaced by a link), saved_bytes, seconds
+    """
+    start = time.time()
+    frames = (sequence or FrameSequence.from_path(first_frame_path)).paths()
+    version_dir = os.path.dirname(first_frame_path)
+    # the other sequences of the version (run_many) keep their checksums
+    version_checksums = read_checksums(version_dir)
+    try:
+        checksums_time = os.path.getmtime(os.path.join(version_dir, CHECKSUM_FILE_NAME))
+    except OSError:
+        checksums_time = 0
+    checksums = {}
+    for path in frames:
+        # hashed when staged or streamed, unless the frame was rendered again since
+        if path in version_checksums and os.path.getmtime(path) <= checksums_time:
+            checksums[path] = version_checksums[path]
+    hashed = hash_frames([path for path in frames if path not in checksums], workers)
+    checksums.update(hashed)
+    if hashed:
+        version_checksums.update(hashed)
+        write_checksums(version_dir, version_checksums)
+    report = dict(frames=len(frames), hashed=len(hashed), unique=len(set(checksums.values())), linked=0,
+                  saved_bytes=0, seconds=0)
+    if not hasattr(os, 'link'):
+        logging.warning('Hardlinks are not supported here, frames not deduplicated')
+        return report
+
+    # md5 -> the file the duplicates link to, the older version first so both versions share the data
+    known_checksums = []
+    previous_dir = get_previous_version_dir(version_dir) if previous else None
+    if previous_dir:
+        previous_checksums = read_checksums(previous_dir)
+        if not previous_checksums:
+            previous_checksums = hash_frames(list_frames_in(previous_dir), workers)
+        known_checksums.append(previous_checksums)
+    known_checksums.append(version_checksums)
+    sources = {}
+    for known in known_checksums:
+        for path, md5 in sorted(known.items()):
+            if path not in checksums and os.path.isfile(path):
+                sources.setdefault(md5, path)
+
+    for path in frames:
+        md5 = checksums[path]
+        source = sources.setdefault(md5, path)
+        if source == path or _same_file(source, path):
+            continue
+        size = os.path.getsize(path)
+        try:
+            _replace_with_link(source, path)
+        except OSError as e:
+            # e.g. the older version is on another filesystem
+            logging.warning('{} not linked to {}: {}'.format(path, source, e))
+            sources[md5] = path
+            continue
+        report['linked'] += 1
+        report['saved_bytes'] += size
+    report['seconds'] = round(time.time() - start, 3)
+    sys.stdout.write('# playblast | {linked} of {frames} frames deduplicated, {saved_bytes} bytes saved '
+                     'in {seconds}s\n'.format(**report))
+    return report
+
+
+def list_frames_in(version_dir):
+    """
+    Frames of every sequence in version_dir
+    """
+    return [os.path.join(version_dir, path) for path in os.listdir(version_dir)
+            if re.match(r'.*\.\d+\.\w+$', path)]
@@ -3,18 +3,23 @@ from __future__ import print_function, absolute_import
 
 import logging
 import os
-import traceback
 
-import pymel.core as pm
+from maya import cmds
 from PySide2 import QtCore
 from PySide2 import QtWidgets
-from shotgun import SG_Shot
-from shotgun import context
 
-from . import playblast
+from . import get_maya_window
+from . import post_jobs
+from . import profiles
+from . import sg_cache
+from . import telemetry
 
 
 class MBlastUI(QtWidgets.QDialog):
+    # emitted from the Shotgun prefetch thread, delivered in the UI thread
+    sg_data_loaded = QtCore.Signal()
+    # emitted from the post job queue thread with a status dict
+    post_job_progress = QtCore.Signal(object)
 
     def __init__(self, parent=None):
         super(MBlastUI, self).__init__(parent)
@@ -22,13 +27,9 @@ class MBlastUI(QtWidgets.QDialog):
         self.debian_version = None
         self.minimum_supported_version = 10
 
-        shot = SG_Shot(context.entity.id)
-        try:
-            self.cut_in, self.cut_out = shot.cut_in, shot.cut_out
-            self.cut_in_cut_out_available = True
-        except AttributeError:
-            self.cut_in_cut_out_available = False
-            logging.info('cut-in/cut-out not found')
+        # cut in/out is filled in by update_cut_range once the Shotgun data is there
+        self.cut_in = self.cut_out = None
+        self.cut_in_cut_out_available = False
 
         if not self.objectName():
             self.setObjectName(u"PlayblastWindow")
@@ -55,7 +56,7 @@ class MBlastUI(QtWidgets.QDialog):
         self.start_frame_sb.setButtonSymbols(QtWidgets.QAbstractSpinBox.NoButtons)
         self.start_frame_sb.setAccelerated(False)
         self.start_frame_sb.setMaximum(9999)
-        self.start_frame_sb.setValue(pm.env.minTime)
+        self.start_frame_sb.setValue(cmds.playbackOptions(q=True, minTime=True))
         self.gridLayout.addWidget(self.start_frame_sb, 1, 2, 1, 1)
         self.start_frame_sb.setFocusPolicy(QtCore.Qt.ClickFocus)
 
@@ -66,7 +67,7 @@ class MBlastUI(QtWidgets.QDialog):
         self.end_frame_sb.setAlignment(QtCore.Qt.AlignLeft | QtCore.Qt.AlignTrailing | QtCore.Qt.AlignVCenter)
         self.end_frame_sb.setButtonSymbols(QtWidgets.QAbstractSpinBox.NoButtons)
         self.end_frame_sb.setMaximum(9999)
-        self.end_frame_sb.setValue(pm.env.maxTime)
+        self.end_frame_sb.setValue(cmds.playbackOptions(q=True, maxTime=True))
         self.gridLayout.addWidget(self.end_frame_sb, 1, 3, 1, 1)
         self.end_frame_sb.setFocusPolicy(QtCore.Qt.ClickFocus)
 
@@ -76,8 +77,8 @@ class MBlastUI(QtWidgets.QDialog):
         self.fit_to_cutin_cutout_cb.setObjectName(u"fit_to_cutin_cutout_cb")
         self.gridLayout.addWidget(self.fit_to_cutin_cutout_cb, 1, 4, 1, 4)
         self.fit_to_cutin_cutout_cb.toggled.connect(self.update_frame_ranges)
-        if not self.cut_in_cut_out_available:
-            self.fit_to_cutin_cutout_cb.setEnabled(False)
+        self.fit_to_cutin_cutout_cb.setEnabled(False)
+        self.sg_data_loaded.connect(self.update_cut_range)
 
         self.after_playblast_lb = QtWidgets.QLabel("After playblast:")
         self.after_playblast_lb.setObjectName(u"after_playblast_lb")
@@ -120,9 +121,24 @@ class MBlastUI(QtWidgets.QDialog):
         self.gridLayout.addWidget(self.upload_version_1_rb, 3, 4, 1, 2, alignment=QtCore.Qt.AlignHCenter)
         self.mv_rb_group.addButton(self.upload_version_1_rb)
 
+        self.profile_lb = QtWidgets.QLabel("Viewport Profile:")
+        self.profile_lb.setObjectName(u"profile_lb")
+        self.gridLayout.addWidget(self.profile_lb, 4, 0, 1, 2)
+
+        self.profile_cb = QtWidgets.QComboBox(self)
+        self.profile_cb.setObjectName(u"profile_cb")
+        self.profile_cb.addItem("Current viewport", None)
+        for profile_name in sorted(profiles.PROFILES):
+            self.profile_cb.addItem(profile_name, profile_name)
+        self.gridLayout.addWidget(self.profile_cb, 4, 2, 1, 4)
+
+        self.proxies_cb = QtWidgets.QCheckBox("Proxies + Contact Sheet")
+        self.proxies_cb.setObjectName(u"proxies_cb")
+        self.gridLayout.addWidget(self.proxies_cb, 4, 6, 1, 2)
+
         self.playblast_btn = QtWidgets.QPushButton("Playblast")
         self.playblast_btn.setObjectName(u"playblast_btn")
-        self.gridLayout.addWidget(self.playblast_btn, 4, 0, 1, 8, alignment=QtCore.Qt.AlignBottom)
+        self.gridLayout.addWidget(self.playblast_btn, 5, 0, 1, 8, alignment=QtCore.Qt.AlignBottom)
         self.playblast_btn.setDefault(True)
         self.playblast_btn.setAutoDefault(True)
         self.playblast_btn.setFocus()
@@ -132,6 +148,25 @@ class MBlastUI(QtWidgets.QDialog):
 
         self.gridLayout_parent.addLayout(self.gridLayout, 0, 0, 1, 1)
 
+        # post job status panel, shown once a playblast is being post-processed
+        self.post_jobs_layout = QtWidgets.QHBoxLayout()
+        self.post_jobs_layout.setObjectName(u"post_jobs_layout")
+        self.post_jobs_layout.setContentsMargins(10, 0, 10, 0)
+        self.post_jobs_lb = QtWidgets.QLabel()
+        self.post_jobs_lb.setObjectName(u"post_jobs_lb")
+        self.post_jobs_layout.addWidget(self.post_jobs_lb)
+        self.post_jobs_pb = QtWidgets.QProgressBar()
+        self.post_jobs_pb.setObjectName(u"post_jobs_pb")
+        self.post_jobs_layout.addWidget(self.post_jobs_pb)
+        self.gridLayout_parent.addLayout(self.post_jobs_layout, 1, 0, 1, 1)
+        self.post_jobs_lb.hide()
+        self.post_jobs_pb.hide()
+        self.post_jobs = None
+        self.telemetry_run = None
+        self.sequence_path = None
+        self.sequence_stats = {}
+        self.post_job_progress.connect(self.update_post_job_progress)
+
         self.use_legacy = False
 
         self.is_old_debian = self.debian_version_is_old()
@@ -146,6 +181,19 @@ class MBlastUI(QtWidgets.QDialog):
             self.add_outdated_notice()
             self.set_enabled_elements(self.get_widget_children(exclude=[self.upload_version_1_rb]), state=False)
 
+        if sg_cache.is_fresh('cut_range'):
+            self.update_cut_range()
+        else:
+            sg_cache.prefetch(callback=self.sg_data_loaded.emit)
+
+    def update_cut_range(self):
+        # UI thread: only what the prefetch cached, a failed prefetch must not turn into a blocking lookup here
+        cut_range = sg_cache.peek('cut_range')
+        self.cut_in_cut_out_available = bool(cut_range)
+        if cut_range:
+            self.cut_in, self.cut_out = cut_range
+        self.fit_to_cutin_cutout_cb.setEnabled(self.cut_in_cut_out_available and not self.use_legacy)
+
     def update_frame_ranges(self):
         if self.fit_to_cutin_cutout_cb.isChecked():
             self.previous_start_frame = self.start_frame_sb.value()
@@ -160,13 +208,15 @@ class MBlastUI(QtWidgets.QDialog):
         return dict(start_frame=self.start_frame_sb.value(),
                     end_frame=self.end_frame_sb.value(),
                     open_in_mv_afterward=self.open_in_upload_version_rb.isChecked(),
-                    open_folder_afterward=self.open_folder_rb.isChecked())
+                    open_folder_afterward=self.open_folder_rb.isChecked(),
+                    profile=self.profile_cb.itemData(self.profile_cb.currentIndex()),
+                    proxies=self.proxies_cb.isChecked())
 
     def get_widget_children(self, exclude=None):
         if exclude is None:
             exclude = []
         widget_children = []
-        qt_types = [QtWidgets.QSpinBox, QtWidgets.QCheckBox, QtWidgets.QRadioButton]
+        qt_types = [QtWidgets.QSpinBox, QtWidgets.QCheckBox, QtWidgets.QRadioButton, QtWidgets.QComboBox]
         for qt_type in qt_types:
             c = self.findChildren(qt_type)
             for child in c:
@@ -226,37 +276,93 @@ class MBlastUI(QtWidgets.QDialog):
             maya_playblast_legacy.run()
             self.close()
             return
-        if not pm.sceneName():
-            QtWidgets.QMessageBox.warning(pm.ui.PyUI('MayaWindow').asQtObject(),
+        if not cmds.file(q=True, sceneName=True):
+            QtWidgets.QMessageBox.warning(get_maya_window(),
                                           'Playblast', 'Please save your scene first.')
             return
+        # pymel, the resource collector and the rest of the playblast dependencies load on the first run only
+        import pymel.core as pm
+        from . import playblast
         # get arguments from UI
         ui_kwargs = self.get_ui_parameters()
+        if self.post_jobs and self.post_jobs.is_running():
+            pm.PopupError('The previous playblast is still being post-processed.')
+            return
+        # the telemetry run spans the playblast and the post jobs, it is finished in update_post_job_progress
+        self.telemetry_run = telemetry.start_run(origin='dialog', scene=cmds.file(q=True, sceneName=True),
+                                                 profile=ui_kwargs.get('profile'))
         # start the playblast
         try:
-            sequence_path = playblast.run(**ui_kwargs)
+            with self.telemetry_run.span('playblast'):
+                sequence_path = playblast.run(save_meta=False, **ui_kwargs)
             if not sequence_path:
+                telemetry.finish_run(self.telemetry_run, status='interrupted')
                 return
         except Exception as e:
+            telemetry.finish_run(self.telemetry_run, status='failed')
             pm.PopupError(str(e))
             logging.exception('Playblast failed')
             return
-        # post action
+        self.sequence_path = sequence_path
+        # frame count and bytes from the verification, the telemetry doesn't list the frames again
+        self.sequence_stats = playblast.get_sequence_stats(sequence_path)
+        # post actions run in the background, Maya is usable again as soon as the frames are on disk
+        self.post_jobs = post_jobs.JobQueue(callback=self.post_job_progress.emit)
+        self.post_jobs.add('Processing frames', self.process_output, args=(sequence_path, ui_kwargs))
+        temp_scene = playblast.temp_data.get('temp_scene')
+        if temp_scene:
+            self.post_jobs.add('Collecting metadata',
+                               self.telemetry_run.timed('metadata', post_jobs.save_meta_data_in_process),
+                               args=(sequence_path, temp_scene), kwargs=ui_kwargs)
+        else:
+            self.post_jobs.add('Collecting metadata', self.telemetry_run.timed('metadata', playblast.save_meta_data),
+                               args=(sequence_path,), kwargs=ui_kwargs, main_thread=True)
         if ui_kwargs.get('open_in_mv_afterward'):
-            try:
-                logging.info('Sending to upload_version2')
-                from upload_version2.utils import launch
-                launch(path=sequence_path)
-            except Exception as e:
-                traceback.print_exc()
-                pm.PopupError(str(e))
+            self.post_jobs.add('Sending to upload_version2',
+                               self.telemetry_run.timed('upload_launch', self.launch_upload_version),
+                               args=(sequence_path,), main_thread=True)
         elif ui_kwargs.get('open_folder_afterward'):
-            logging.info('Opening folder')
             import webbrowser
-            webbrowser.open(os.path.dirname(sequence_path))
+            self.post_jobs.add('Opening folder', self.telemetry_run.timed('open_folder', webbrowser.open),
+                               args=(os.path.dirname(sequence_path),))
+        self.post_jobs.start()
+
+    @staticmethod
+    def process_output(sequence_path, ui_kwargs):
+        from . import playblast
+        # the metadata job runs next with the same kwargs and records the outputs
+        ui_kwargs.update(playblast.process_output(sequence_path, **ui_kwargs))
+
+    @staticmethod
+    def launch_upload_version(sequence_path):
+        logging.info('Sending to upload_version2')
+        from upload_version2.utils import launch
+        from . import retention
+        # a version sent to the dailies is never evicted
+        retention.mark_published(os.path.dirname(sequence_path))
+        launch(path=sequence_path)
+
+    def update_post_job_progress(self, status):
+        self.post_jobs_lb.show()
+        self.post_jobs_pb.show()
+        self.post_jobs_pb.setMaximum(status['total'])
+        self.post_jobs_pb.setValue(status['index'])
+        if status['status'] == 'running':
+            logging.info(status['name'])
+            self.post_jobs_lb.setText(status['name'] + '...')
+        elif status['status'] == 'failed':
+            self.post_jobs_lb.setText(status['name'] + ' failed')
+            telemetry.finish_run(self.telemetry_run, output_path=self.sequence_path, status='failed',
+                                 **self.sequence_stats)
+            import pymel.core as pm
+            pm.PopupError(status['error'])
+        else:
+            self.post_jobs_lb.setText('Done')
+            telemetry.finish_run(self.telemetry_run, output_path=self.sequence_path, status='ok',
+                                 **self.sequence_stats)
 
 
 if __name__ == '__main__':
     # Create and show the form
-    dialog = MBlastUI(parent=pm.ui.PyUI('MayaWindow').asQtObject())
+    dialog = MBlastUI(parent=get_maya_window())
     main_dialog = dialog.show()
@@ -0,0 +1,267 @@
+# coding=utf-8
+"""
+Incremental playblasts.
+
+Every frame gets a fingerprint of its evaluated scene state (the animation curves and time dependent nodes upstream
+of the camera, the geometry, the lights and the shading networks, their visibility, plus the static state of every
+node upstream of them, the shading assignments, the display layers and the render settings).
+The fingerprints are stored in a manifest next to the frames. On the next blast of the task the frames whose
+fingerprint did not change are hardlinked from the previous version and only the dirty sub-ranges are rendered.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+
+from maya import cmds
+
+from . import integrity
+from . import playblast
+from .sequence import frames_to_ranges
+from .versions import get_previous_version_dir
+
+MANIFEST_NAME = 'manifest.json'
+# what a display layer changes in the viewport, besides its members
+DISPLAY_LAYER_ATTRIBUTES = ('enabled', 'visibility', 'displayType', 'levelOfDetail', 'shading', 'texturing',
+                            'playback', 'hideOnPlayback', 'color', 'overrideRGBColors', 'colorRGB')
+
+
+def _digest(*values):
+    return hashlib.sha1(json.dumps(values, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def get_scene_nodes(camera):
+    """
+    The camera, the geometry shapes and the lights (drawn with displayLights="all", see profiles) together with
+    all their parent transforms. Hidden shapes are included, they may be keyed visible on other frames.
+
+    Parameters
+    ----------
+    camera: str
+
+    Returns
+    -------
+    list of str
+        long node names
+    """
+    shapes = cmds.ls(geometry=True, noIntermediate=True, long=True) or []
+    shapes += cmds.ls(lights=True, long=True) or []
+    shapes += cmds.ls(str(camera), long=True) or []
+    nodes = set()
+    for shape in shapes:
+        # every ancestor transform moves the shape, add them all: "|a|b|shape" -> "|a", "|a|b"
+        parts = shape.split('|')
+        for index in range(2, len(parts) + 1):
+            nodes.add('|'.join(parts[:index]))
+    return sorted(nodes)
+
+
+def get_mesh_digest(mesh):
+    """
+    Digest of a mesh as evaluated now: its topology counts, object space points and UVs
+    """
+    return _digest(cmds.polyEvaluate(mesh, vertex=True), cmds.polyEvaluate(mesh, face=True),
+                   cmds.xform(mesh + '.vtx[*]', query=True, objectSpace=True, translation=True),
+                   cmds.polyEditUV(mesh + '.map[*]', query=True) if cmds.polyEvaluate(mesh, uvcoord=True) else None)
+
+
+def get_static_plug_values(node):
+    """
+    The values a node holds itself: its unconnected keyable and user defined plugs and its deformer weights.
+    They don't depend on the current time, also on animated nodes.
+    """
+    values = []
+    attributes = set(cmds.listAttr(node, keyable=True) or []) | set(cmds.listAttr(node, userDefined=True) or [])
+    for attribute in sorted(attributes):
+        plug = '{}.{}'.format(node, attribute)
+        try:
+            if not cmds.connectionInfo(plug, isDestination=True):
+                values.append((attribute, cmds.getAttr(plug)))
+        except (RuntimeError, ValueError):
+            # e.g. multi parents, read through their children
+            pass
+    # skin and deformer weights are neither keyable nor connected
+    if cmds.attributeQuery('weightList', node=node, exists=True):
+        for index in cmds.getAttr(node + '.weightList', multiIndices=True) or []:
+            values.append(('weightList', index, cmds.getAttr('{}.weightList[{}].weights'.format(node, index))))
+    return values
+
+
+def get_look_state(shading_engines, history):
+    """
+    What the viewport draws the geometry with, besides the plug values of the shading networks: the members of the
+    shading engines, the file texture paths and the display layers
+
+    Parameters
+    ----------
+    shading_engines: list of str
+    history: list of str
+        long names of the nodes upstream of the geometry and the shading engines
+
+    Returns
+    -------
+    list
+    """
+    state = []
+    for engine in shading_engines:
+        # per face assignments included
+        state.append((engine, sorted(cmds.sets(engine, query=True) or [])))
+    # not keyable, missed by get_static_plug_values
+    for file_node in sorted(cmds.ls(history, type='file', long=True) or []):
+        state.append((file_node, cmds.getAttr(file_node + '.fileTextureName')))
+    for layer in sorted(cmds.ls(type='displayLayer') or []):
+        if layer == 'defaultLayer':
+            continue
+        values = [cmds.getAttr('{}.{}'.format(layer, attribute)) for attribute in DISPLAY_LAYER_ATTRIBUTES
+                  if cmds.attributeQuery(attribute, node=layer, exists=True)]
+        state.append((layer, values, sorted(cmds.editDisplayLayerMembers(layer, query=True, fullNames=True) or [])))
+    return state
+
+
+def get_frame_fingerprints(camera, start_frame, end_frame, settings=None):
+    """
+    Fingerprint the evaluated state of every frame
+
+    Parameters
+    ----------
+    camera: str
+    start_frame: int
+    end_frame: int
+    settings: dict
+        render settings, a change of any of them makes every frame dirty
+
+    Returns
+    -------
+    static_fingerprint: str
+    frame_fingerprints: dict
+        frame number (as str, like in the manifest) -> fingerprint
+    """
+    nodes = get_scene_nodes(camera)
+    shapes = cmds.ls(nodes, shapes=True, long=True) or []
+    shading_engines = sorted(set(cmds.listConnections(shapes, type='shadingEngine') or [])) if shapes else []
+    # long names throughout, so the shapes of the history and the scene nodes match; the materials and textures
+    # are upstream of the shading engines, keyed ones included
+    history = (cmds.ls(cmds.listHistory(nodes + shading_engines) or [], long=True) or []) if nodes else []
+    anim_curves = sorted(set(cmds.ls(history, type='animCurve') or []))
+    time_nodes = set(cmds.ls(cmds.listConnections('time1', source=False, destination=True) or [], long=True) or [])
+    time_nodes = time_nodes.intersection(history).difference(anim_curves)
+
+    # nodes driven by animation change with the current time, their evaluated state only goes into the per frame
+    # fingerprints; the plug values every node holds itself (also the deformers, the skin weights and the original
+    # meshes upstream) go into the static one
+    dynamic_attributes = []
+    static_state = []
+    for node in sorted(set(nodes).union(history).difference(anim_curves)):
+        static_state.append((node, get_static_plug_values(node)))
+    for node in sorted(set(nodes).union(cmds.ls(history, type='mesh', long=True) or [])):
+        node_history = set(cmds.ls(cmds.listHistory(node) or [], long=True) or [])
+        animated = bool(node_history.intersection(anim_curves) or node_history.intersection(time_nodes))
+        is_transform = cmds.objectType(node, isAType='transform')
+        if animated:
+            # keyed visibility, and expressions, caches and the like only visible through the nodes they drive
+            dynamic_attributes.append(node + '.visibility')
+            if node_history.intersection(time_nodes):
+                dynamic_attributes += [node + '.matrix'] if is_transform \
+                    else [node + '.boundingBoxMin', node + '.boundingBoxMax']
+        elif is_transform:
+            if not cmds.listConnections(node, source=True, destination=False):
+                static_state.append((node, cmds.getAttr(node + '.matrix'), cmds.getAttr(node + '.visibility')))
+        elif cmds.objectType(node, isAType='mesh'):
+            # a bounding box misses the edits inside it, points and UVs don't
+            static_state.append((node, get_mesh_digest(node)))
+        elif cmds.attributeQuery('boundingBoxMin', node=node, exists=True):
+            static_state.append((node, cmds.getAttr(node + '.boundingBoxMin'),
+                                 cmds.getAttr(node + '.boundingBoxMax')))
+    static_state.append(get_look_state(shading_engines, history))
+    static_fingerprint = _digest(settings or {}, anim_curves, sorted(time_nodes), static_state)
+
+    frame_fingerprints = {}
+    for frame in range(int(start_frame), int(end_frame) + 1):
+        values = []
+        if anim_curves:
+            values.append(cmds.keyframe(anim_curves, query=True, eval=True, time=(frame, frame)))
+        for attribute in dynamic_attributes:
+            values.append(cmds.getAttr(attribute, time=frame))
+        frame_fingerprints[str(frame)] = _digest(values)
+    return static_fingerprint, frame_fingerprints
+
+
+def load_manifest(version_dir):
+    manifest_path = os.path.join(version_dir, MANIFEST_NAME)
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError) as e:
+        logging.warning('Manifest "{}" not read: {}'.format(manifest_path, e))
+
+
+def write_manifest(manifest):
+    manifest_path = os.path.join(os.path.dirname(manifest['output_path']), MANIFEST_NAME)
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest_path
+
+
+def get_frame_path(manifest, frame):
+    return playblast.get_frame_path(manifest['output_path'], frame, manifest['frame_padding'], manifest['extension'])
+
+
+def prepare(camera, output_path, start_frame, end_frame, frame_padding=4, extension='jpg', settings=None,
+            force_full=False):
+    """
+    Fingerprint the frames, hardlink the unchanged ones from the previous version
+    and return the sub-ranges that still need to be rendered
+
+    Parameters
+    ----------
+    camera: str
+    output_path: str
+    start_frame: int
+    end_frame: int
+    frame_padding: int
+    extension: str
+    settings: dict
+    force_full: bool
+        render every frame, the manifest is still written for the next run
+
+    Returns
+    -------
+    dirty_ranges: list of tuple
+    manifest: dict
+        to be written with write_manifest once the render succeeded
+    """
+    static_fingerprint, frame_fingerprints = get_frame_fingerprints(camera, start_frame, end_frame, settings)
+    manifest = dict(output_path=output_path, frame_padding=frame_padding, extension=extension,
+                    static=static_fingerprint, frames=frame_fingerprints)
+    dirty_frames = [int(frame) for frame in frame_fingerprints]
+    previous_dir = None if force_full else get_previous_version_dir(os.path.dirname(output_path), MANIFEST_NAME)
+    previous = load_manifest(previous_dir) if previous_dir else None
+    if previous and previous.get('static') == static_fingerprint:
+        version_dir = os.path.dirname(output_path)
+        if not os.path.isdir(version_dir):
+            os.makedirs(version_dir)
+        dirty_frames = []
+        for frame, fingerprint in frame_fingerprints.items():
+            previous_frame_path = get_frame_path(previous, frame)
+            # a frame of the previous version broken since (or never verified) is rendered again
+            if previous['frames'].get(frame) != fingerprint \
+                    or integrity.check_frame(previous_frame_path, previous.get('extension', extension))[0] != 'ok':
+                dirty_frames.append(int(frame))
+                continue
+            frame_path = get_frame_path(manifest, frame)
+            if os.path.lexists(frame_path):
+                os.remove(frame_path)
+            try:
+                os.link(previous_frame_path, frame_path)
+            except (OSError, AttributeError):
+                # no hardlinks across devices or on old Windows pythons
+                shutil.copy2(previous_frame_path, frame_path)
+        sys.stdout.write('# playblast | incremental: {} of {} frames reused from:\n{}\n'.format(
+            len(frame_fingerprints) - len(dirty_frames), len(frame_fingerprints), previous_dir))
+    elif not force_full:
+        sys.stdout.write('# playblast | incremental: no matching previous version, rendering every frame\n')
+    return frames_to_ranges(dirty_frames), manifest
@@ -0,0 +1,119 @@
+# coding=utf-8
+"""
+Integrity check of a rendered sequence, run before the frames are handed to the post actions.
+
+Every expected frame must exist, be non-empty and, for JPEG and PNG, end with its end-of-image marker:
+a full disk or a crashed playblast leaves truncated files that only fail later on the farm.
+Only the tail of each file is read (memory-mapped) and the frames are spread over a thread pool.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import mmap
+import os
+import time
+from multiprocessing.pool import ThreadPool
+
+DEFAULT_WORKERS = 16
+# extension -> bytes the file must end with, trailing zero padding is tolerated
+END_MARKERS = {
+    'jpg': b'\xff\xd9',
+    'jpeg': b'\xff\xd9',
+    'png': b'IEND\xaeB`\x82',
+}
+TAIL_BYTES = 64
+
+
+def check_frame(path, extension='jpg'):
+    """
+    Parameters
+    ----------
+    path: str
+    extension: str
+
+    Returns
+    -------
+    tuple
+        status ("ok", "missing", "empty" or "truncated"), size in bytes
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return 'missing', 0
+    if not size:
+        return 'empty', 0
+    marker = END_MARKERS.get(extension.lower())
+    if marker:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                tail = mapped[max(0, size - TAIL_BYTES):]
+            finally:
+                mapped.close()
+        if not tail.rstrip(b'\0').endswith(marker):
+            return 'truncated', size
+    return 'ok', size
+
+
+def verify_sequence(output_path, start_frame, end_frame, frame_padding=4, extension='jpg', workers=None):
+    """
+    Check every frame of the range
+
+    Parameters
+    ----------
+    output_path: str
+        sequence base path, without frame number and extension
+    start_frame: int
+    end_frame: int
+    frame_padding: int
+    extension: str
+    workers: int
+
+    Returns
+    -------
+    dict
+        ok, expected (frame count), missing, empty and truncated (frame lists), bytes, seconds
+    """
+    start = time.time()
+    frames = list(range(int(start_frame), int(end_frame) + 1))
+
+    def check(frame):
+        path = '{}.{}.{}'.format(output_path, str(frame).zfill(frame_padding), extension)
+        return check_frame(path, extension)
+
+    pool = ThreadPool(min(workers or DEFAULT_WORKERS, max(1, len(frames))))
+    try:
+        results = pool.map(check, frames)
+    finally:
+        pool.close()
+        pool.join()
+
+    report = dict(output_path=output_path, start_frame=int(start_frame), end_frame=int(end_frame),
+                  expected=len(frames), missing=[], empty=[], truncated=[], bytes=0)
+    for frame, (status, size) in zip(frames, results):
+        report['bytes'] += size
+        if status != 'ok':
+            report[status].append(frame)
+    report['ok'] = not (report['missing'] or report['empty'] or report['truncated'])
+    report['seconds'] = round(time.time() - start, 3)
+    return report
+
+
+def get_bad_frames(report):
+    return sorted(report['missing'] + report['empty'] + report['truncated'])
+
+
+def format_report(report, max_frames=20):
+    """
+    Human readable summary of a verify_sequence report
+    """
+    if report['ok']:
+        return '{expected} frames verified, {bytes} bytes'.format(**report)
+    lines = ['{} of {} frames are broken in {}'.format(len(get_bad_frames(report)), report['expected'],
+                                                       report['output_path'])]
+    for status in ('missing', 'empty', 'truncated'):
+        if report[status]:
+            frames = ', '.join(str(frame) for frame in report[status][:max_frames])
+            if len(report[status]) > max_frames:
+                frames += '...'
+            lines.append('  {}: {}'.format(status, frames))
+    return '\n'.join(lines)
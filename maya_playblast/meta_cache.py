@@ -0,0 +1,169 @@
+# coding=utf-8
+"""
+Memoized metadata collection.
+
+MayaResourceCollector.collect walks the references, textures and caches of the scene after every blast. Its result
+is stored on disk per project/task together with a fingerprint of those inputs (the paths with the size and
+modification time of the files, the scene units and the loaded plugins), of the artist's scene path and of the
+collect arguments. The file of the scene itself is left out: the collection runs on the temp scene, which is saved
+anew on every blast of a modified scene.
+While the fingerprint is unchanged the next blast of the task reuses it, only the per-run fields (frame range,
+output path, version...) are filled in anew.
+
+>>> meta_cache.collect(collector, resource_path, enabled=True, **kwargs)
+>>> meta_cache.invalidate()  # or save_meta_data(..., refresh_meta=True), forces a full collection
+
+The reuse is off unless enabled (save_meta_data(..., meta_cache=True) or MAYA_PLAYBLAST_META_CACHE=1): it relies
+on the collector returning the collected metadata from collect() and taking it back through write(data), and on
+RUN_FIELDS naming every per-run field of that metadata, check both against the resource_collector in use before
+turning it on. A collector without write() always runs the full collection.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+from maya import cmds
+from shotgun import context
+
+from . import atomic
+from .sg_cache import CACHE_DIR_NAME
+from .versions import VERSION_REGEX
+
+# node type -> attribute holding a file path the metadata depends on
+FILE_ATTRIBUTES = {
+    'file': 'fileTextureName',
+    'AlembicNode': 'abc_File',
+    'gpuCache': 'cacheFileName',
+    'audio': 'filename',
+    'imagePlane': 'imageName',
+}
+# the fields that change on every blast, never reused from the cache
+RUN_FIELDS = ('resource_path', 'output_path', 'version', 'start_frame', 'end_frame', 'proxy_outputs',
+              'dedup_report', 'profile', 'frame_sequence')
+ENABLED = os.environ.get('MAYA_PLAYBLAST_META_CACHE') == '1'
+
+
+def get_cache_path():
+    return os.path.join(context.USER_TEMPDIR, CACHE_DIR_NAME,
+                        'meta_project_{}_task_{}.json'.format(context.project.id, context.task.id))
+
+
+def _get_file_state(path):
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return [path, None, None]
+    return [path, stat.st_mtime, stat.st_size]
+
+
+def get_scene_fingerprint(inputs=()):
+    """
+    Digest of the scene inputs the resource collector reads
+
+    Parameters
+    ----------
+    inputs: list
+        anything else the metadata depends on, e.g. the artist's scene path, the collector and collect arguments
+
+    Returns
+    -------
+    str
+    """
+    inputs = [['inputs', list(inputs)]]
+    for reference in sorted(cmds.file(q=True, reference=True) or []):
+        inputs.append(['reference'] + _get_file_state(re.sub(r'\{\d+\}$', '', reference)))
+    for node_type, attribute in sorted(FILE_ATTRIBUTES.items()):
+        for node in sorted(cmds.ls(type=node_type) or []):
+            inputs.append([node_type, node] + _get_file_state(cmds.getAttr('{}.{}'.format(node, attribute))))
+    inputs.append(['units', cmds.currentUnit(q=True, linear=True), cmds.currentUnit(q=True, time=True)])
+    inputs.append(['plugins', sorted(cmds.pluginInfo(q=True, listPlugins=True) or [])])
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def get_run_fields(resource_path, **kwargs):
+    """
+    The per-run fields of the metadata
+    """
+    fields = dict((key, kwargs[key]) for key in RUN_FIELDS if key in kwargs)
+    fields['resource_path'] = resource_path
+    fields['output_path'] = os.path.dirname(resource_path)
+    match = VERSION_REGEX.match(os.path.basename(os.path.dirname(resource_path).rstrip('/\\')))
+    if match:
+        fields['version'] = match.group(0)
+    return fields
+
+
+def load():
+    try:
+        with open(get_cache_path()) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def save(fingerprint, data):
+    cache_path = get_cache_path()
+    try:
+        if not os.path.isdir(os.path.dirname(cache_path)):
+            os.makedirs(os.path.dirname(cache_path))
+        atomic.write_file(cache_path, lambda f: json.dump(dict(fingerprint=fingerprint, data=data, time=time.time()),
+                                                          f))
+    except (IOError, OSError, TypeError, ValueError) as e:
+        logging.warning('Metadata cache "{}" not written: {}'.format(cache_path, e))
+
+
+def invalidate():
+    """
+    Drop the cached metadata of the current project/task, the next blast runs the full collection
+    """
+    cache_path = get_cache_path()
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+
+
+def collect(collector, resource_path, refresh=False, enabled=ENABLED, inputs=(), **kwargs):
+    """
+    collector.collect(**kwargs), or the cached metadata with fresh per-run fields when the scene inputs and the
+    arguments did not change since the last blast of the task
+
+    Parameters
+    ----------
+    collector: MayaResourceCollector
+    resource_path: str
+    refresh: bool
+        run the full collection in any case
+    enabled: bool
+        reuse the cached metadata, see the module docstring
+    inputs: list
+        the artist's scene path and the collector arguments, part of the fingerprint
+    kwargs
+        collect keyword arguments, part of the fingerprint but for the RUN_FIELDS
+
+    Returns
+    -------
+    dict or None
+        the metadata
+    """
+    if not enabled or not hasattr(collector, 'write'):
+        return collector.collect(**kwargs)
+    start = time.time()
+    fingerprint = get_scene_fingerprint(list(inputs) + sorted(
+        [key, value] for key, value in kwargs.items() if key not in RUN_FIELDS))
+    cached = {} if refresh else load()
+    if cached.get('fingerprint') == fingerprint:
+        data = dict(cached['data'])
+        data.update(get_run_fields(resource_path, **kwargs))
+        collector.write(data)
+        sys.stdout.write('# playblast | scene inputs unchanged, metadata reused in {:.2f}s\n'.format(
+            time.time() - start))
+        return data
+    data = collector.collect(**kwargs)
+    if isinstance(data, dict):
+        save(fingerprint, dict((key, value) for key, value in data.items() if key not in RUN_FIELDS))
+    return data
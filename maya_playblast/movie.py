@@ -0,0 +1,257 @@
+# coding=utf-8
+"""
+Direct-to-movie playblasts: a single cmds.playblast pass draws the frames with the settings of the image sequences
+(offscreen, at the output resolution and percent, with or without ornaments). A post-render callback of the
+playblast panel reads every frame back from the viewport and pipes its raw pixels into a local encoder (ffmpeg on
+the PATH, or MAYA_PLAYBLAST_ENCODER), which writes a single movie. No image sequence goes through the flipbook,
+except for the optional stills: every Nth frame as a JPEG next to the movie.
+
+A bounded queue sits between the viewport and the encoder: the next frame is drawn while the encoder works on
+the previous ones, and the playblast waits once buffer_frames frames are pending, so memory stays flat.
+
+>>> playblast.run(movie=True)             # returns the movie path
+>>> playblast.run(movie=True, stills=10)  # and a JPEG of every 10th frame
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import ctypes
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+from maya import cmds
+
+ENCODER = os.environ.get('MAYA_PLAYBLAST_ENCODER')
+DEFAULT_EXTENSION = 'mp4'
+DEFAULT_CODEC_ARGS = ('-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18', '-pix_fmt', 'yuv420p')
+DEFAULT_BUFFER_FRAMES = 8
+# Maya time units -> frames per second
+TIME_UNITS = {'game': 15, 'film': 24, 'pal': 25, 'ntsc': 30, 'show': 48, 'palf': 50, 'ntscf': 60}
+
+
+def find_encoder():
+    """
+    MAYA_PLAYBLAST_ENCODER, or ffmpeg found on the PATH
+
+    Returns
+    -------
+    str or None
+    """
+    if ENCODER:
+        return ENCODER
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        for name in ('ffmpeg', 'ffmpeg.exe'):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path) and os.access(path, os.X_OK):
+                return path
+
+
+def get_scene_fps():
+    unit = cmds.currentUnit(q=True, time=True)
+    if unit in TIME_UNITS:
+        return TIME_UNITS[unit]
+    match = re.match(r'([\d.]+)fps$', unit or '')
+    return float(match.group(1)) if match else 24
+
+
+class MovieEncoder(object):
+    """
+    Long-lived encoder process fed with raw RGBA frames (bottom-up, as stored by MImage) through its stdin
+
+    Parameters
+    ----------
+    output: str
+        movie path
+    width: int
+    height: int
+    fps: float
+    encoder: str or list
+        executable, or command prefix, taking ffmpeg arguments, find_encoder() by default
+    codec_args: list
+    buffer_frames: int
+        frames waiting for the encoder before write() blocks
+    """
+
+    def __init__(self, output, width, height, fps=24, encoder=None, codec_args=DEFAULT_CODEC_ARGS,
+                 buffer_frames=DEFAULT_BUFFER_FRAMES):
+        encoder = encoder or find_encoder()
+        if not encoder:
+            raise RuntimeError('No movie encoder found, put ffmpeg on the PATH or set MAYA_PLAYBLAST_ENCODER')
+        self.output = output
+        self.command = (list(encoder) if isinstance(encoder, (list, tuple)) else [encoder]) \
+            + ['-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', '{}x{}'.format(width, height),
+               '-framerate', str(fps), '-i', '-', '-vf', 'vflip'] + list(codec_args) + [output]
+        self.frames = 0
+        self.error = None
+        self.queue = Queue(maxsize=buffer_frames)
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE)
+        self.thread = threading.Thread(target=self._pipe)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _pipe(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                return
+            # after a failure the frames are still taken off the queue, so write() never blocks for good
+            if self.error is None:
+                try:
+                    self.process.stdin.write(frame)
+                except (IOError, OSError) as e:
+                    self.error = e
+
+    def write(self, frame):
+        """
+        Queue the raw pixels of a frame, waits while buffer_frames frames are pending
+        """
+        if self.error is not None:
+            raise RuntimeError('"{}" stopped reading frames: {}'.format(' '.join(self.command), self.error))
+        self.queue.put(frame)
+        self.frames += 1
+
+    def close(self, abort=False):
+        """
+        Wait for the encoder to finish the movie, or stop it and remove the movie when aborting
+        """
+        self.queue.put(None)
+        self.thread.join()
+        try:
+            self.process.stdin.close()
+        except (IOError, OSError):
+            pass
+        if abort:
+            self.process.terminate()
+            self.process.wait()
+            if os.path.exists(self.output):
+                os.remove(self.output)
+            return
+        if self.process.wait() or self.error is not None:
+            raise RuntimeError('"{}" exited with code {}'.format(' '.join(self.command), self.process.returncode))
+
+
+def get_pixel_bytes(image):
+    """
+    Copy of the RGBA pixels of an MImage
+    """
+    width, height = image.getSize()
+    return ctypes.string_at(image.pixels(), width * height * 4)
+
+
+def get_still_path(output_path, frame, frame_padding=4):
+    return '{}.{}.jpg'.format(output_path, str(int(frame)).zfill(frame_padding))
+
+
+def render_movie(output_path, start_frame, end_frame, width_height, fps=None, stills=0, encoder=None,
+                 extension=DEFAULT_EXTENSION, buffer_frames=DEFAULT_BUFFER_FRAMES, frame_padding=4, percent=100,
+                 show_ornaments=False, off_screen=True):
+    """
+    Encode the playblast frames of the current camera into a movie, the camera and the viewport are set up by
+    the caller (see playblast.render_playblast)
+
+    Parameters
+    ----------
+    output_path: str
+        base path, the movie is written to "<output_path>.<extension>"
+    start_frame: int
+    end_frame: int
+    width_height: tuple
+        playblast resolution, scaled by percent
+    fps: float
+        the scene frame rate by default
+    stills: int
+        also write every stills-th frame as "<output_path>.####.jpg", 0 for none
+    encoder: str or list
+        see MovieEncoder
+    extension: str
+    buffer_frames: int
+    frame_padding: int
+    percent: int
+    show_ornaments: bool
+    off_screen: bool
+        see cmds.playblast
+
+    Returns
+    -------
+    str or None
+        movie path, None when the render was interrupted
+    """
+    from maya.api import OpenMaya
+    from maya.api import OpenMayaUI
+    # yuv420p needs even dimensions
+    width, height = [int(value) * int(percent) // 100 // 2 * 2 for value in width_height]
+    movie_path = '{}.{}'.format(output_path, extension)
+    if not os.path.isdir(os.path.dirname(movie_path)):
+        os.makedirs(os.path.dirname(movie_path))
+    start_frame, end_frame = int(start_frame), int(end_frame)
+    frame_count = end_frame - start_frame + 1
+    panel = cmds.playblast(activeEditor=True).split('|')[-1]
+    view = OpenMayaUI.M3dView.getM3dViewFromModelPanel(panel)
+    image = OpenMaya.MImage()
+    # cmds.playblast needs an output: what it writes is thrown away, low quality JPEGs in a local scratch dir
+    scratch_dir = tempfile.mkdtemp(prefix='maya_playblast_movie_')
+    start = time.time()
+    movie_encoder = MovieEncoder(movie_path, width, height, fps or get_scene_fps(), encoder,
+                                 buffer_frames=buffer_frames)
+    captured = set()
+    errors = []
+
+    def capture(*args):
+        # the panel view is drawn offscreen at the playblast size once (or more) per frame, it is read back from
+        # the GPU while cmds.playblast goes on, errors are raised once it is done
+        frame = int(round(cmds.currentTime(q=True)))
+        if errors or frame in captured or not start_frame <= frame <= end_frame:
+            return
+        try:
+            view.readColorBuffer(image, True)
+            size = tuple(image.getSize())
+            if size != (width, height):
+                # only the odd pixel dropped for the encoder is expected
+                if abs(size[0] - width) > 1 or abs(size[1] - height) > 1:
+                    raise RuntimeError('The viewport read back {}x{} instead of {}x{}'.format(
+                        size[0], size[1], width, height))
+                image.resize(width, height, False)
+            movie_encoder.write(get_pixel_bytes(image))
+            if stills and (frame - start_frame) % stills == 0:
+                image.writeToFile(get_still_path(output_path, frame, frame_padding), 'jpg')
+            captured.add(frame)
+        except Exception as e:
+            errors.append(e)
+
+    callback_id = OpenMayaUI.MUiMessage.add3dViewPostRenderMsgCallback(panel, capture)
+    try:
+        interrupted = not cmds.playblast(startTime=start_frame, endTime=end_frame, format='image',
+                                         filename=os.path.join(scratch_dir, 'frame'), compression='jpg',
+                                         quality=1, framePadding=frame_padding, forceOverwrite=True, viewer=False,
+                                         offScreen=off_screen, percent=percent, widthHeight=width_height,
+                                         showOrnaments=show_ornaments)
+        if errors:
+            raise errors[0]
+        if not interrupted and len(captured) != frame_count:
+            raise RuntimeError('{} of {} frames captured from {}'.format(len(captured), frame_count, panel))
+    except Exception:
+        movie_encoder.close(abort=True)
+        raise
+    finally:
+        OpenMaya.MMessage.removeCallback(callback_id)
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    movie_encoder.close(abort=interrupted)
+    if interrupted:
+        logging.warning('Movie playblast interrupted, {} removed'.format(movie_path))
+        return
+    seconds = time.time() - start
+    sys.stdout.write('# playblast | {} frames encoded in {:.1f}s ({:.1f} fps), {} bytes\n'.format(
+        movie_encoder.frames, seconds, movie_encoder.frames / max(seconds, 1e-6), os.path.getsize(movie_path)))
+    sys.stdout.write('# playblast | movie path:\n{}\n'.format(movie_path))
+    return movie_path.replace('\\', '/')
@@ -1,36 +1,196 @@
 # coding=utf-8
 from __future__ import absolute_import, print_function, unicode_literals, division
 
-import glob
+import json
 import logging
 import os
-import re
+import shutil
 import sys
+import tempfile
+import threading
+import time
 
 import pymel.core as pm
 from PySide2.QtWidgets import QMessageBox
 from shotgun import context
 from maya import cmds
-from resource_collector.maya_resource_collector import MayaResourceCollector
+
+from . import get_maya_window
+from . import integrity
+from . import profiles
+from . import sg_cache
+from .sequence import FrameSequence
+from . import telemetry
+from . import versions
 
 
 def run(**kwargs):
     try:
         return do_playblast(**kwargs)
     except Exception as e:
-        QMessageBox.critical(pm.ui.PyUI('MayaWindow').asQtObject(), "Error", str(e))
+        QMessageBox.critical(get_maya_window(), "Error", str(e))
         logging.exception('Playblast failed')
 
 
 def do_playblast(**kwargs):
-    camera = kwargs.get('camera') or get_current_camera()
-    save_path = kwargs.get('output_path') or get_output_path(**kwargs)
-    image_path_mask = render_playblast(camera, save_path, **kwargs)
-    if not image_path_mask:
-        QMessageBox.warning(pm.ui.PyUI('MayaWindow').asQtObject(), 'Playblast', 'Playblast interrupted.')
-        return
-    save_meta_data(image_path_mask, **kwargs)
-    return image_path_mask
+    # the dialog starts its own telemetry run to include the post-render stages
+    owns_run = telemetry.current_run() is None
+    if owns_run:
+        telemetry.start_run(origin='do_playblast', scene=cmds.file(q=True, sceneName=True),
+                            profile=kwargs.get('profile'))
+    image_path_mask = None
+    status = 'failed'
+    try:
+        # resume mode: finish the last interrupted playblast of the task instead of starting a new version
+        journal = None
+        if kwargs.get('resume'):
+            from . import resume
+            journal = resume.find_incomplete(context.get_userdir('flipbook'))
+            error = resume.get_resume_error(journal) if journal else None
+            if error:
+                sys.stdout.write('# playblast | {}\n'.format(error))
+                journal = None
+            if not journal:
+                sys.stdout.write('# playblast | no interrupted playblast to resume, starting a new one\n')
+        if journal:
+            with telemetry.span('render_playblast', resumed=True):
+                image_path_mask = resume.resume_playblast(journal, workers=kwargs.get('chunk_workers'))
+        else:
+            with telemetry.span('camera'):
+                camera = kwargs.get('camera') or get_current_camera()
+            with telemetry.span('output_path'):
+                save_path = kwargs.get('output_path') or get_output_path(**kwargs)
+            with telemetry.span('render_playblast'):
+                if kwargs.get('chunked'):
+                    from . import chunked
+                    image_path_mask = chunked.render_chunked(camera, save_path, **kwargs)
+                else:
+                    image_path_mask = render_playblast(camera, save_path, **kwargs)
+        if not image_path_mask:
+            status = 'interrupted'
+            QMessageBox.warning(get_maya_window(), 'Playblast', 'Playblast interrupted.')
+            return
+        # the dialog collects the metadata in its post job queue
+        if kwargs.get('save_meta', True):
+            # the output stages run first so the metadata records them
+            kwargs.update(process_output(image_path_mask, **kwargs))
+            with telemetry.span('metadata'):
+                save_meta_data(image_path_mask, **kwargs)
+        # old versions and temp scenes over budget are evicted off the critical path, on request
+        if kwargs.get('retention', False):
+            from . import retention
+            retention.run_in_background()
+        status = 'ok'
+        return image_path_mask
+    finally:
+        if owns_run:
+            telemetry.finish_run(output_path=image_path_mask, status=status,
+                                 **(get_sequence_stats(image_path_mask) if image_path_mask else {}))
+
+
+def run_many(shots=None, **kwargs):
+    """
+    Playblast several cameras back to back in the same session, sharing the temp scene save, the Shotgun lookups
+    and the version: every camera is rendered into the same version directory with its own name suffix.
+    The incremental and chunked modes work on a single sequence per version and are not used here.
+
+    >>> run_many([('reviewCamA', 1001, 1100), ('reviewCamB', 1001, 1100)])
+    >>> run_many()  # the shots of the camera sequencer
+
+    Parameters
+    ----------
+    shots: list
+        (camera, start_frame, end_frame) tuples or dicts with camera, start_frame, end_frame and an optional name,
+        the camera sequencer shots by default
+    kwargs
+        render_playblast options, output_path overrides the version path
+
+    Returns
+    -------
+    dict
+        shot name (the camera name for the tuples) -> first frame path, stops at the first interrupted shot
+    """
+    if shots is None:
+        shots = get_sequencer_shots()
+    shots = [shot if isinstance(shot, dict) else dict(zip(('camera', 'start_frame', 'end_frame'), shot))
+             for shot in shots]
+    if not shots:
+        raise RuntimeError('No cameras to playblast.')
+    kwargs = dict(kwargs, incremental=False, chunked=False)
+    owns_run = telemetry.current_run() is None
+    if owns_run:
+        telemetry.start_run(origin='run_many', scene=cmds.file(q=True, sceneName=True),
+                            profile=kwargs.get('profile'), shots=len(shots))
+    results = {}
+    stats = {}
+    status = 'failed'
+    try:
+        # the shared setup, done once for every camera
+        if kwargs.pop('save_temp', True):
+            with telemetry.span('temp_save'):
+                temp_scene_path = save_temp_scene(background=kwargs.get('background_save', False))
+            if temp_scene_path:
+                temp_data['temp_scene'] = temp_scene_path
+                sys.stdout.write('Temp Scene saved to:\n{}\n'.format(temp_scene_path))
+        with telemetry.span('output_path'):
+            base_path = kwargs.pop('output_path', None) or get_output_path(**kwargs)
+        resolution = kwargs.pop('resolution', None)
+        sg_resolution = None
+
+        status = 'interrupted'
+        for shot in shots:
+            name = shot.get('name') or str(shot['camera']).split('|')[-1]
+            # the shots may come as names, the resolution lookup and the render work on nodes
+            camera = pm.PyNode(shot['camera'])
+            shot_resolution = resolution or get_dailies_resolution_from_camera(camera)
+            if not shot_resolution:
+                with telemetry.span('resolution'):
+                    sg_resolution = sg_resolution or get_dailies_resolution_from_sg()
+                shot_resolution = sg_resolution
+            output_path = '{}_{}'.format(base_path, name.replace(':', '_'))
+            with telemetry.span('render_playblast', shot=name):
+                first_frame_path = render_playblast(camera, output_path, resolution=shot_resolution,
+                                                    save_temp=False,
+                                                    **dict(kwargs, start_frame=shot['start_frame'],
+                                                           end_frame=shot['end_frame']))
+            if not first_frame_path:
+                return results
+            stats[name] = get_sequence_stats(first_frame_path)
+            if kwargs.get('save_meta', True):
+                meta_kwargs = dict(kwargs, **process_output(first_frame_path, **kwargs))
+                with telemetry.span('metadata', shot=name):
+                    save_meta_data(first_frame_path, **meta_kwargs)
+            results[name] = first_frame_path
+        status = 'ok'
+        return results
+    finally:
+        if owns_run:
+            # one record for the version dir shared by the cameras, next to the first sequence
+            telemetry.finish_run(output_path=sorted(results.values())[0] if results else None, status=status,
+                                 sequences=results, shot_stats=stats,
+                                 frames=sum(stat['frames'] for stat in stats.values()),
+                                 output_bytes=sum(stat['output_bytes'] for stat in stats.values()))
+
+
+def get_sequencer_shots():
+    """
+    Unmuted shots of the camera sequencer, in sequence order
+
+    Returns
+    -------
+    list of dict
+        name, camera, start_frame, end_frame
+    """
+    shots = []
+    for shot in cmds.ls(type='shot') or []:
+        if cmds.shot(shot, q=True, mute=True):
+            continue
+        shots.append((cmds.shot(shot, q=True, sequenceStartTime=True),
+                      dict(name=cmds.shot(shot, q=True, shotName=True) or shot,
+                           camera=cmds.shot(shot, q=True, currentCamera=True),
+                           start_frame=cmds.shot(shot, q=True, startTime=True),
+                           end_frame=cmds.shot(shot, q=True, endTime=True))))
+    return [shot for _, shot in sorted(shots, key=lambda item: item[0])]
 
 
 def get_current_camera():
@@ -68,25 +228,15 @@ def get_output_path(**kwargs):
 
 
 def get_playblast_path(extension='jpg', frame_mask=False, **kwargs):
-    entity_name = context.task.entity.full_name
+    entity_name = sg_cache.get_entity_full_name()
     user_dir = context.get_userdir('flipbook')
-    if not os.path.isdir(user_dir):
-        os.makedirs(user_dir)
-
-    all_versions = []
-    for path in sorted(os.listdir(user_dir)):
-        if re.match(r"v\d{3}$", path):
-            all_versions.append(path)
-    if all_versions:
-        new_version_digits = str(int(''.join(re.findall(r'(\d)', all_versions[-1]))) + 1)
-    else:
-        new_version_digits = '1'
-    new_version_string = 'v' + new_version_digits.zfill(3)
+    # reserve the version directory right away so concurrent playblasts can't pick the same one
+    new_version_string, version_dir = versions.allocate_version(user_dir)
 
     prefix = '{entity_full_name}_{dep_short_name}_{version}'.format(entity_full_name=entity_name,
-                                                                    dep_short_name=context.task.step.short_name,
+                                                                    dep_short_name=sg_cache.get_step_short_name(),
                                                                     version=new_version_string)
-    base_path = os.path.join(user_dir, new_version_string.zfill(3), prefix)
+    base_path = os.path.join(version_dir, prefix)
     if frame_mask:
         frame_padding = kwargs.get('frame_padding', 4)
         # create a path string formatted like "/drive/path/to/image.%0<number>d.<extension>"
@@ -97,17 +247,58 @@ def get_playblast_path(extension='jpg', frame_mask=False, **kwargs):
     return playblast_path
 
 
+def get_frame_path(output_path, frame, frame_padding=4, extension='jpg'):
+    """
+    Path of a single frame of the sequence rendered to output_path, "<output_path>.<frame>.<extension>"
+
+    Parameters
+    ----------
+    output_path: str
+    frame: int
+    frame_padding: int
+    extension: str
+
+    Returns
+    -------
+    str
+    """
+    return '{}.{}.{}'.format(output_path, str(int(frame)).zfill(frame_padding), extension)
+
+
 temp_data = {}
 
 
-def save_temp_scene():
+def get_scene_file_state(scene_path):
+    """
+    Path, modification time and size of a scene file, enough to tell whether it changed on disk
+
+    Returns
+    -------
+    list or None
+    """
+    try:
+        stat = os.stat(scene_path)
+    except OSError:
+        return
+    return [os.path.normpath(scene_path), stat.st_mtime, stat.st_size]
+
+
+def save_temp_scene(background=False):
     """
-    Save scene to task temp dir
+    Save scene to task temp dir.
+    An unmodified scene whose file did not change since the last temp save reuses the previous temp scene.
+
+    Parameters
+    ----------
+    background: bool
+        save to a local scratch dir and copy the snapshot to the task temp dir in a background thread,
+        use wait_temp_scene before reading it
 
     Returns
     -------
     saved_current_scene_path : str
     """
+    wait_temp_scene()
     task_id = context.task.id
     # out path
     tmp_path = os.path.join(context.USER_TEMPDIR, 'tsk_{}'.format(task_id))
@@ -120,26 +311,118 @@ def save_temp_scene():
             logging.error('Can`t create temp folder "{}": {}'.format(tmp_path, e))
 
     current_name = pm.sceneName()
+    # the scene the temp scene stands for, e.g. for the metadata collected from the temp scene
+    temp_data['source_scene'] = str(current_name)
     saved_current_scene_path = os.path.join(os.path.normpath(tmp_path), current_name.basename())
+    snapshot_info_path = saved_current_scene_path + '.snapshot.json'
 
-    # make way for a new temp scene by deleting the old one if it already exists
-    if os.path.isfile(saved_current_scene_path):
+    # an unmodified scene is identical to its file, so the snapshot of the same file is still valid
+    was_modified = cmds.file(q=True, modified=True)
+    source_state = get_scene_file_state(current_name)
+    if not was_modified and source_state and os.path.isfile(saved_current_scene_path):
         try:
-            os.remove(saved_current_scene_path)
-        except Exception as e:
-            logging.error('Old scene was not removed: {}'.format(e))
+            with open(snapshot_info_path) as f:
+                snapshot_info = json.load(f)
+        except (IOError, OSError, ValueError):
+            snapshot_info = {}
+        if snapshot_info.get('source') == source_state:
+            sys.stdout.write('# playblast | Temp Scene unchanged, reused (~{:.1f}s saved)\n'.format(
+                snapshot_info.get('save_seconds', 0)))
+            return saved_current_scene_path
+
+    # make way for a new temp scene by deleting the old one if it already exists
+    for old_path in (saved_current_scene_path, snapshot_info_path):
+        if os.path.isfile(old_path):
+            try:
+                os.remove(old_path)
+            except Exception as e:
+                logging.error('Old scene was not removed: {}'.format(e))
+    save_path = saved_current_scene_path
+    if background:
+        local_dir = os.path.join(tempfile.gettempdir(), 'maya_playblast', 'tsk_{}'.format(task_id))
+        if not os.path.isdir(local_dir):
+            os.makedirs(local_dir)
+        save_path = os.path.join(local_dir, current_name.basename())
     # save
+    save_start = time.time()
     try:
-        cmds.file(rename=saved_current_scene_path)
+        cmds.file(rename=save_path)
         cmds.file(save=True, force=True)
     except Exception as e:
         logging.error('Scene not saved: {}'.format(e))
         return
-    # restore name
-    cmds.file(rename=current_name)
+    finally:
+        # restore name, and the modified state the save has cleared
+        cmds.file(rename=current_name)
+        if was_modified:
+            cmds.file(modified=True)
+    snapshot_info = dict(source=None if was_modified else source_state,
+                         save_seconds=round(time.time() - save_start, 2))
+    if background:
+        thread = threading.Thread(target=_finish_temp_scene,
+                                  args=(save_path, saved_current_scene_path, snapshot_info))
+        thread.start()
+        temp_data['temp_scene_thread'] = thread
+        sys.stdout.write('# playblast | Temp Scene saved locally in {}s, copying in the background\n'.format(
+            snapshot_info['save_seconds']))
+    else:
+        _finish_temp_scene(None, saved_current_scene_path, snapshot_info)
     return saved_current_scene_path
 
 
+def _finish_temp_scene(local_path, saved_current_scene_path, snapshot_info):
+    copy_start = time.time()
+    try:
+        if local_path:
+            shutil.copyfile(local_path, saved_current_scene_path)
+            os.remove(local_path)
+            snapshot_info['copy_seconds'] = round(time.time() - copy_start, 2)
+            sys.stdout.write('# playblast | Temp Scene copied in {}s off the critical path\n'.format(
+                snapshot_info['copy_seconds']))
+        with open(saved_current_scene_path + '.snapshot.json', 'w') as f:
+            json.dump(snapshot_info, f)
+    except Exception as e:
+        logging.error('Temp Scene not finished: {}'.format(e))
+
+
+def wait_temp_scene():
+    """
+    Wait for a temp scene saved with background=True to reach the task temp dir
+    """
+    thread = temp_data.pop('temp_scene_thread', None)
+    if thread:
+        thread.join()
+
+
+def set_renderable_camera(camera):
+    """
+    Make camera the only renderable camera: without a model panel to look through (batch mode) cmds.playblast
+    renders the renderable camera
+
+    Parameters
+    ----------
+    camera: str
+        camera transform or shape
+
+    Returns
+    -------
+    dict
+        camera shape -> its previous renderable value, for restore_renderable_cameras
+    """
+    shapes = cmds.ls(str(camera), dag=True, type='camera', long=True)
+    if not shapes:
+        raise ValueError('No camera "{}"'.format(camera))
+    initial = dict((shape, cmds.getAttr(shape + '.renderable')) for shape in cmds.ls(type='camera', long=True))
+    for shape in initial:
+        cmds.setAttr(shape + '.renderable', shape == shapes[0])
+    return initial
+
+
+def restore_renderable_cameras(initial):
+    for shape, renderable in initial.items():
+        cmds.setAttr(shape + '.renderable', renderable)
+
+
 def render_playblast(render_camera, output_path, resolution=None, **kwargs):
     """
     The Playblast render itself.
@@ -150,23 +433,40 @@ def render_playblast(render_camera, output_path, resolution=None, **kwargs):
     render_camera
     output_path
     resolution
+
+    Returns
+    -------
+    str or None
+        first frame path, the movie path with movie=True, None when interrupted
     """
-    temp_scene_path = save_temp_scene()
-    if temp_scene_path:
-        temp_data['temp_scene'] = temp_scene_path
-        sys.stdout.write('Temp Scene saved to:\n{}\n'.format(temp_scene_path))
-    else:
-        sys.stdout.write('Temp Scene not created.')
+    # batch workers render a scene that is already on disk, so they skip the temp scene
+    if kwargs.get('save_temp', True):
+        with telemetry.span('temp_save'):
+            temp_scene_path = save_temp_scene(background=kwargs.get('background_save', False))
+        if temp_scene_path:
+            temp_data['temp_scene'] = temp_scene_path
+            sys.stdout.write('Temp Scene saved to:\n{}\n'.format(temp_scene_path))
+        else:
+            sys.stdout.write('Temp Scene not created.')
 
     # get correct resolution from camera data
-    playblast_resolution = resolution \
-        or get_dailies_resolution_from_camera() or get_dailies_resolution_from_sg()
+    with telemetry.span('resolution'):
+        playblast_resolution = resolution \
+            or get_dailies_resolution_from_camera() or get_dailies_resolution_from_sg()
 
     w, h = playblast_resolution
     sys.stdout.write('# playblast | SG Resolution:\n{}\n'.format(playblast_resolution))
 
     sys.stdout.write('# playblasting to:\n{}\n'.format(output_path))
 
+    # staged mode: render to a local scratch dir and transfer the frames to output_path afterwards,
+    # incremental playblasts render into the version next to the reused frames
+    render_path = output_path
+    if kwargs.get('staged') and not kwargs.get('incremental') and not kwargs.get('movie'):
+        from . import staging
+        render_path = staging.get_scratch_path(output_path, kwargs.get('scratch_dir'))
+        sys.stdout.write('# playblast | staged in:\n{}\n'.format(render_path))
+
     # prepare kwargs.
     force_overwrite = kwargs.get('force_overwrite', True)
     sequence_time = kwargs.get('sequence_time', False)
@@ -183,48 +483,193 @@ def render_playblast(render_camera, output_path, resolution=None, **kwargs):
     start_frame = kwargs.get('start_frame', None)
     end_frame = kwargs.get('end_frame', None)
 
-    # store the camera that was active before
-    initial_camera = pm.lookThru(q=True)
-    # switch to the one specified for the playblast
-    pm.lookThru(render_camera)
-
+    # store the camera that was active before, there is no model panel to look through in batch mode
+    batch = cmds.about(batch=True)
+    initial_camera = None if batch else pm.lookThru(q=True)
+    initial_renderable = {}
     # store initial timeline range to revert to later
     start_frame_initial = pm.env.minTime
     end_frame_initial = pm.env.maxTime
-    # if start and end frames were modified, temporarily set the timeline to them
-    if (start_frame != start_frame_initial) or (end_frame != end_frame_initial):
-        pm.env.minTime = start_frame
-        pm.env.maxTime = end_frame
-
-    # begin playblast render and get its image path pattern.
-    img_name_pattern = cmds.playblast(format='image',
-                                      filename=output_path,
-                                      forceOverwrite=force_overwrite,
-                                      sequenceTime=sequence_time,
-                                      clearCache=clear_cache,
-                                      offScreen=off_screen,
-                                      framePadding=frame_padding,
-                                      percent=percent,
-                                      compression=compression,
-                                      quality=quality,
-                                      viewer=viewer,
-                                      widthHeight=width_height,
-                                      options=options,
-                                      showOrnaments=show_ornaments)
-
-    # reverting to the timeline settings that were set before the playblast
-    if start_frame and end_frame:
-        pm.env.minTime = start_frame_initial
-        pm.env.maxTime = end_frame_initial
-
-    # revert to the camera that was active before
-    pm.lookThru(initial_camera)
+    watcher_process = None
+    # everything changed for the render is reverted in the finally block, also when the playblast raises
+    try:
+        # switch to the one specified for the playblast
+        if batch:
+            initial_renderable = set_renderable_camera(render_camera)
+        else:
+            pm.lookThru(render_camera)
+
+        # if start and end frames were modified, temporarily set the timeline to them
+        if (start_frame != start_frame_initial) or (end_frame != end_frame_initial):
+            pm.env.minTime = start_frame
+            pm.env.maxTime = end_frame
+        rendered_range = int(pm.env.minTime), int(pm.env.maxTime)
+
+        # movie mode: the playblast frames are piped into a local encoder instead of being written as images,
+        # e.g. movie=True, stills=10 for a JPEG of every 10th frame next to the movie
+        if kwargs.get('movie'):
+            from . import movie
+            profile = kwargs.get('profile')
+            with profiles.apply_profile(profile), telemetry.span('render', profile=profile, movie=True,
+                                                                 frames=rendered_range[1] - rendered_range[0] + 1):
+                return movie.render_movie(output_path, rendered_range[0], rendered_range[1], width_height,
+                                          fps=kwargs.get('fps'),
+                                          stills=kwargs.get('stills', 0),
+                                          encoder=kwargs.get('encoder'),
+                                          frame_padding=frame_padding,
+                                          percent=percent,
+                                          show_ornaments=show_ornaments,
+                                          off_screen=off_screen)
+
+        # incremental mode: reuse the unchanged frames of the previous version and render only the dirty sub-ranges
+        frame_ranges = None
+        manifest = None
+        if kwargs.get('incremental'):
+            from . import incremental
+            settings = dict(camera=str(render_camera), width_height=list(width_height), percent=percent,
+                            compression=compression, quality=quality, show_ornaments=show_ornaments,
+                            profile=kwargs.get('profile'))
+            frame_ranges, manifest = incremental.prepare(render_camera, output_path,
+                                                         pm.env.minTime, pm.env.maxTime,
+                                                         frame_padding=frame_padding,
+                                                         extension=compression,
+                                                         settings=settings,
+                                                         force_full=kwargs.get('force_full', False))
+        if frame_ranges is None:
+            frame_count = int(pm.env.maxTime) - int(pm.env.minTime) + 1
+        else:
+            frame_count = sum(range_end - range_start + 1 for range_start, range_end in frame_ranges)
+
+        playblast_kwargs = dict(format='image',
+                                filename=render_path,
+                                forceOverwrite=force_overwrite,
+                                sequenceTime=sequence_time,
+                                clearCache=clear_cache,
+                                offScreen=off_screen,
+                                framePadding=frame_padding,
+                                percent=percent,
+                                compression=compression,
+                                quality=quality,
+                                viewer=viewer,
+                                widthHeight=width_height,
+                                options=options,
+                                showOrnaments=show_ornaments)
+        # a playblast rendered straight into the version keeps a journal, so it can be resumed
+        journal = None
+        if kwargs.get('save_temp', True) and render_path == output_path:
+            from . import resume
+            temp_scene_path = temp_data.get('temp_scene')
+            # the state of a temp scene still copied in the background is recorded once it lands
+            copy_thread = temp_data.get('temp_scene_thread') if temp_scene_path else None
+            journal = resume.start_journal(output_path, render_camera, rendered_range[0], rendered_range[1],
+                                           frame_padding=frame_padding,
+                                           extension=compression,
+                                           resolution=width_height,
+                                           render_options=kwargs,
+                                           temp_scene=temp_scene_path,
+                                           temp_scene_state=get_scene_file_state(temp_scene_path)
+                                           if temp_scene_path and not copy_thread else None)
+            if copy_thread:
+                resume.record_temp_scene_state(journal, copy_thread)
+        # post-process the frames while they are written, e.g. stream_consumers=[{'type': 'checksum'}]
+        if kwargs.get('stream_consumers'):
+            from . import stream
+            watcher_process = stream.start_watcher_process(render_path, compression, kwargs['stream_consumers'])
+
+        # viewport performance profile, e.g. profile='layout-fast'
+        profile = kwargs.get('profile')
+        with profiles.apply_profile(profile), telemetry.span('render', profile=profile, frames=frame_count):
+            render_start = time.time()
+            # begin playblast render and get its image path pattern.
+            if frame_ranges is None:
+                img_name_pattern = cmds.playblast(**playblast_kwargs)
+            else:
+                # every frame may already be reused, the pattern is then built by hand
+                img_name_pattern = '{}.{}.{}'.format(output_path, '#' * frame_padding, compression)
+                for range_start, range_end in frame_ranges:
+                    img_name_pattern = cmds.playblast(startTime=range_start, endTime=range_end, **playblast_kwargs)
+                    if not img_name_pattern:
+                        break
+            render_seconds = time.time() - render_start
+        if img_name_pattern and frame_count:
+            fps = profiles.record_run(profile, frame_count, render_seconds, scene=cmds.file(q=True, sceneName=True))
+            sys.stdout.write('# playblast | profile {}: {} frames in {:.1f}s ({:.1f} fps)\n'.format(
+                profile or 'viewport', frame_count, render_seconds, fps))
+    except Exception:
+        if render_path != output_path:
+            staging.remove_scratch(render_path)
+        raise
+    finally:
+        if watcher_process:
+            # the frames are fine, but what the consumers were to produce (checksums, movie...) is not
+            with telemetry.span('stream', consumers=[spec.get('type') for spec in kwargs['stream_consumers']]) \
+                    as entry:
+                entry['ok'] = stream.finish_watcher_process(watcher_process)
+            if not entry['ok']:
+                logging.error('Stream post-processing of {} failed, its outputs are missing or incomplete: {}'.format(
+                    render_path, json.dumps(kwargs['stream_consumers'])))
+
+        # reverting to the timeline settings that were set before the playblast
+        if start_frame and end_frame:
+            pm.env.minTime = start_frame_initial
+            pm.env.maxTime = end_frame_initial
+
+        # revert to the camera that was active before
+        if batch:
+            restore_renderable_cameras(initial_renderable)
+        else:
+            pm.lookThru(initial_camera)
 
     # checking whether the playblast was successful
     if img_name_pattern:
-        first_frame_path = sorted(glob.glob(img_name_pattern.replace('#' * frame_padding, '*')))[0]
+        # missing, empty or truncated frames must not reach the post actions
+        report = None
+        if kwargs.get('verify', True):
+            with telemetry.span('verify') as entry:
+                report = integrity.verify_sequence(render_path, rendered_range[0], rendered_range[1],
+                                                   frame_padding, compression)
+                entry.update(frames=report['expected'], ok=report['ok'])
+            if not report['ok']:
+                if journal:
+                    resume.finish_journal(journal, 'broken', report)
+                if render_path != output_path:
+                    staging.remove_scratch(render_path)
+                raise RuntimeError(integrity.format_report(report))
+            sys.stdout.write('# playblast | {} in {}s\n'.format(integrity.format_report(report),
+                                                                  report['seconds']))
+        if journal:
+            resume.finish_journal(journal, 'complete', report)
+        # only verified frames are offered to the next incremental blast
+        if manifest:
+            incremental.write_manifest(manifest)
+        if render_path != output_path:
+            with telemetry.span('transfer') as entry:
+                try:
+                    entry.update(staging.transfer(render_path, output_path, workers=kwargs.get('transfer_workers')))
+                except Exception:
+                    staging.remove_scratch(render_path)
+                    raise
+            img_name_pattern = '{}.{}.{}'.format(output_path, '#' * frame_padding, compression)
+        # a verified range is complete on disk, only an unverified one is listed
+        with telemetry.span('index'):
+            if report:
+                sequence = FrameSequence.from_range(output_path, rendered_range[0], rendered_range[1],
+                                                    frame_padding, compression)
+                sequence.size = report['bytes']
+            else:
+                sequence = FrameSequence.from_pattern(img_name_pattern)
+        if not sequence:
+            raise RuntimeError('No frame of {} was written'.format(sequence.pattern))
+        temp_data['sequence'] = sequence
+        first_frame_path = sequence.first_path
         sys.stdout.write('# playblast | first frame path:\n{}\n'.format(first_frame_path))
         return first_frame_path.replace('\\', '/')
+    if render_path != output_path:
+        staging.remove_scratch(render_path)
+    if journal:
+        # the progress so far, run(resume=True) renders the rest
+        resume.finish_journal(journal, 'interrupted', integrity.verify_sequence(
+            output_path, rendered_range[0], rendered_range[1], frame_padding, compression))
 
 
 def save_meta_data(resource_path, **kwargs):
@@ -234,14 +679,114 @@ def save_meta_data(resource_path, **kwargs):
     Parameters
     ----------
     resource_path: str
+    kwargs
+        collect keyword arguments, meta_cache=True reuses the metadata of the last blast of the task while the
+        scene inputs are unchanged (see maya_playblast.meta_cache), refresh_meta=True runs the full collection
+        in any case
     """
-
+    from resource_collector.maya_resource_collector import MayaResourceCollector
+    from . import meta_cache
+    wait_temp_scene()
+    content_type = kwargs.get('content_type') or 'animation_scene'
     meta = MayaResourceCollector(
         resource_path,
-        content_type=kwargs.get('content_type') or 'animation_scene',
+        content_type=content_type,
         temp_scene=temp_data.get('temp_scene'),
         publish_scene=temp_data.get('temp_scene'))
-    meta.collect(**kwargs)
+    meta_cache.collect(meta, resource_path, refresh=kwargs.pop('refresh_meta', False),
+                       enabled=kwargs.pop('meta_cache', meta_cache.ENABLED),
+                       inputs=[content_type, temp_data.get('source_scene') or cmds.file(q=True, sceneName=True)],
+                       **kwargs)
+
+
+def process_output(resource_path, **kwargs):
+    """
+    The stages run on the rendered frames before the metadata: deduplication and proxies
+
+    Parameters
+    ----------
+    resource_path: str
+        first frame path
+    kwargs
+        dedup: bool, on by default, proxies and contact_sheet, see make_proxies
+
+    Returns
+    -------
+    dict
+        the metadata keyword arguments recording the outputs: frame_sequence (FrameSequence.to_dict),
+        dedup_report and proxy_outputs
+    """
+    if kwargs.get('movie'):
+        # the stages work on frames, a movie goes to the metadata as it is
+        return {}
+    sequence = get_sequence(resource_path)
+    outputs = dict(frame_sequence=sequence.to_dict())
+    if kwargs.get('dedup', True):
+        from . import dedup
+        with telemetry.span('dedup') as entry:
+            outputs['dedup_report'] = dedup.deduplicate(resource_path, sequence=sequence)
+            entry['saved_bytes'] = outputs['dedup_report']['saved_bytes']
+    if kwargs.get('proxies'):
+        with telemetry.span('proxies'):
+            outputs['proxy_outputs'] = make_proxies(resource_path, sequence=sequence, **kwargs)
+    return outputs
+
+
+def get_sequence(resource_path):
+    """
+    FrameSequence of a first frame path, the one indexed by the last render_playblast when it matches
+
+    Returns
+    -------
+    FrameSequence
+    """
+    sequence = temp_data.get('sequence')
+    if sequence is None or sequence.first_path != resource_path.replace('\\', '/'):
+        sequence = FrameSequence.from_path(resource_path)
+    return sequence
+
+
+def get_sequence_stats(resource_path):
+    """
+    Frame count and bytes of a rendered sequence for the telemetry, taken from the verification of the last
+    render_playblast when it is the same sequence, the frames are only listed and stat'ed otherwise
+
+    Returns
+    -------
+    dict
+        frames, output_bytes
+    """
+    sequence = temp_data.get('sequence')
+    if sequence is not None and sequence.size is not None \
+            and sequence.first_path == resource_path.replace('\\', '/'):
+        return dict(frames=len(sequence), output_bytes=sequence.size)
+    frames, output_bytes = telemetry.get_sequence_stats(resource_path)
+    return dict(frames=frames, output_bytes=output_bytes)
+
+
+def make_proxies(resource_path, **kwargs):
+    """
+    Downscaled variants and contact sheet of the rendered sequence, see proxies.make_proxies
+
+    Parameters
+    ----------
+    resource_path: str
+        first frame path
+    kwargs
+        proxies: True for the default variants or a list of (name, scale) pairs, contact_sheet: bool,
+        sequence: the FrameSequence of resource_path
+
+    Returns
+    -------
+    dict
+        variant name -> first frame path, recorded in the metadata as proxy_outputs
+    """
+    from . import proxies
+    variants = kwargs.get('proxies')
+    if variants is True:
+        variants = proxies.DEFAULT_VARIANTS
+    return proxies.make_proxies(resource_path, variants=variants, contact_sheet=kwargs.get('contact_sheet', True),
+                                sequence=kwargs.get('sequence'))
 
 
 def get_dailies_resolution_from_sg():
@@ -253,7 +798,7 @@ def get_dailies_resolution_from_sg():
     tuple
     """
     # getting the version resolution field's data from SG
-    dailies_resolution_str = context.project.sg_dailies_resolution
+    dailies_resolution_str = sg_cache.get_dailies_resolution()
     # конвертируем его значения в список float
     # parse & convert its values
     dailies_resolution_width, dailies_resolution_height = [float(value) for value in dailies_resolution_str.split('x')]
@@ -0,0 +1,134 @@
+# coding=utf-8
+"""
+Post-playblast stages (metadata collection, launching upload_version2, opening the folder) run by a job queue
+in a worker thread, so the artist gets Maya back as soon as the frames are on disk.
+
+The metadata collector walks the scene, which is not safe outside Maya's main thread, so it runs in a mayapy
+process on the temp scene. Stages that touch Qt are handed back to the main thread.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+from . import batch
+
+
+class JobQueue(object):
+    """
+    Runs the added jobs one after another in a worker thread, stopping at the first failure
+    since later stages depend on the earlier ones.
+
+    callback receives a dict for every change: name, status ("running", "failed" or "done"), index, total, error.
+    It is called from the worker thread.
+    """
+
+    def __init__(self, callback=None):
+        self.jobs = []
+        self.callback = callback
+        self.thread = None
+
+    def add(self, name, function, args=(), kwargs=None, main_thread=False):
+        """
+        Parameters
+        ----------
+        name: str
+            shown in the progress panel
+        function: callable
+        args: tuple
+        kwargs: dict
+        main_thread: bool
+            run the function in Maya's main thread, for stages that touch Qt or the scene
+        """
+        self.jobs.append((name, function, args, kwargs or {}, main_thread))
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        return self.thread
+
+    def is_running(self):
+        return bool(self.thread and self.thread.is_alive())
+
+    def _notify(self, **status):
+        if self.callback:
+            try:
+                self.callback(status)
+            except Exception:
+                logging.exception('Post job progress callback failed')
+
+    def _run(self):
+        total = len(self.jobs)
+        for index, (name, function, args, kwargs, main_thread) in enumerate(self.jobs):
+            self._notify(name=name, status='running', index=index, total=total, error=None)
+            try:
+                if main_thread:
+                    import maya.utils
+                    maya.utils.executeInMainThreadWithResult(function, *args, **kwargs)
+                else:
+                    function(*args, **kwargs)
+            except Exception as e:
+                logging.exception('{} failed'.format(name))
+                self._notify(name=name, status='failed', index=index, total=total, error=str(e))
+                return
+        self._notify(name=None, status='done', index=total, total=total, error=None)
+
+
+def save_meta_data_in_process(resource_path, temp_scene, mayapy=batch.MAYAPY, **kwargs):
+    """
+    playblast.save_meta_data run by a mayapy process on the temp scene
+
+    Parameters
+    ----------
+    resource_path: str
+    temp_scene: str
+    mayapy: str
+    kwargs
+        save_meta_data keyword arguments, must be JSON serializable
+    """
+    from . import playblast
+    # a temp scene saved in the background must be complete before mayapy opens it
+    playblast.wait_temp_scene()
+    args_file, args_path = tempfile.mkstemp(prefix='maya_playblast_meta_', suffix='.json')
+    with os.fdopen(args_file, 'w') as f:
+        json.dump(dict(resource_path=resource_path, temp_scene=temp_scene,
+                       source_scene=playblast.temp_data.get('source_scene'), kwargs=kwargs), f)
+    env = batch.get_subprocess_env()
+    try:
+        process = subprocess.Popen([mayapy, '-m', 'maya_playblast.post_jobs', args_path],
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env)
+        output = process.communicate()[0]
+    finally:
+        os.remove(args_path)
+    if process.returncode:
+        sys.stdout.write(output.decode('utf-8', 'replace'))
+        raise RuntimeError('Metadata collection failed with code {}'.format(process.returncode))
+
+
+def main(argv=None):
+    args_path = (argv or sys.argv[1:])[0]
+    with open(args_path) as f:
+        args = json.load(f)
+    import maya.standalone
+    maya.standalone.initialize(name='python')
+    try:
+        from maya import cmds
+        from . import playblast
+        cmds.file(args['temp_scene'], open=True, force=True)
+        playblast.temp_data['temp_scene'] = args['temp_scene']
+        playblast.temp_data['source_scene'] = args.get('source_scene')
+        playblast.save_meta_data(args['resource_path'], **args['kwargs'])
+    finally:
+        maya.standalone.uninitialize()
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
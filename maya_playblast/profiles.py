@@ -0,0 +1,140 @@
+# coding=utf-8
+"""
+Viewport performance profiles applied to the playblast panel for the time of the render.
+
+>>> with apply_profile('layout-fast'):
+...     cmds.playblast(...)
+
+Everything a profile changes (modelEditor display options and object type visibility, hardwareRenderingGlobals
+attributes, smooth mesh preview) is restored afterwards, also when the playblast raises. There is no model panel
+in mayapy batch workers, only the hardwareRenderingGlobals and smooth mesh parts apply there.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import contextlib
+import json
+import logging
+import os
+import time
+
+from maya import cmds
+
+# modelEditor flags toggling the object types shown in the viewport
+OBJECT_TYPES = ('nurbsCurves', 'nurbsSurfaces', 'polymeshes', 'subdivSurfaces', 'planes', 'lights', 'cameras',
+                'joints', 'ikHandles', 'deformers', 'dynamics', 'particleInstancers', 'fluids', 'hairSystems',
+                'follicles', 'nCloths', 'nParticles', 'nRigids', 'dynamicConstraints', 'locators', 'dimensions',
+                'pivots', 'handles', 'textures', 'strokes', 'motionTrails', 'pluginShapes', 'clipGhosts',
+                'greasePencils', 'manipulators', 'grid', 'hud')
+# only the geometry ends up in review playblasts
+GEOMETRY_ONLY = dict((object_type, object_type in ('nurbsSurfaces', 'polymeshes', 'subdivSurfaces', 'pluginShapes'))
+                     for object_type in OBJECT_TYPES)
+
+PROFILES = {
+    'layout-fast': {
+        'model_editor': dict(GEOMETRY_ONLY, displayAppearance='smoothShaded', displayTextures=False,
+                             displayLights='default', shadows=False, pluginShapes=False),
+        'hardware_rendering': dict(ssaoEnable=False, motionBlurEnable=False, multiSampleEnable=False,
+                                   lineAAEnable=False, enableTextureMaxRes=True, textureMaxResolution=256),
+        'smooth_mesh_preview': False,
+    },
+    'anim-review': {
+        'model_editor': dict(GEOMETRY_ONLY, displayAppearance='smoothShaded', displayTextures=True,
+                             displayLights='default', shadows=False),
+        'hardware_rendering': dict(ssaoEnable=False, motionBlurEnable=False, multiSampleEnable=True,
+                                   lineAAEnable=True, enableTextureMaxRes=True, textureMaxResolution=1024),
+        'smooth_mesh_preview': False,
+    },
+    'final-look': {
+        'model_editor': dict(GEOMETRY_ONLY, displayAppearance='smoothShaded', displayTextures=True,
+                             displayLights='all', shadows=True),
+        'hardware_rendering': dict(ssaoEnable=True, motionBlurEnable=True, multiSampleEnable=True,
+                                   lineAAEnable=True, enableTextureMaxRes=False),
+        'smooth_mesh_preview': True,
+    },
+}
+HARDWARE_RENDERING_NODE = 'hardwareRenderingGlobals'
+RUN_LOG = os.environ.get('MAYA_PLAYBLAST_RUN_LOG') \
+    or os.path.join(os.path.expanduser('~'), '.maya_playblast', 'run.log')
+
+
+def get_playblast_panel():
+    """
+    The model panel cmds.playblast renders from
+    """
+    editor = cmds.playblast(activeEditor=True)
+    return editor.split('|')[-1]
+
+
+@contextlib.contextmanager
+def apply_profile(name, panel=None):
+    """
+    Apply the profile for the duration of the with block, None leaves the viewport as it is
+
+    Parameters
+    ----------
+    name: str
+        one of PROFILES
+    panel: str
+        model panel, the playblast panel by default
+    """
+    if not name:
+        yield
+        return
+    profile = PROFILES[name]
+    model_editor = {} if cmds.about(batch=True) else profile.get('model_editor', {})
+    if model_editor:
+        panel = panel or get_playblast_panel()
+    restore_editor = {}
+    restore_hardware = {}
+    restore_smooth = {}
+    try:
+        for flag, value in model_editor.items():
+            restore_editor[flag] = cmds.modelEditor(panel, query=True, **{flag: True})
+            cmds.modelEditor(panel, edit=True, **{flag: value})
+        for attribute, value in profile.get('hardware_rendering', {}).items():
+            plug = '{}.{}'.format(HARDWARE_RENDERING_NODE, attribute)
+            restore_hardware[plug] = cmds.getAttr(plug)
+            cmds.setAttr(plug, value)
+        if 'smooth_mesh_preview' in profile:
+            for mesh in cmds.ls(type='mesh', noIntermediate=True, long=True) or []:
+                plug = mesh + '.displaySmoothMesh'
+                current = cmds.getAttr(plug)
+                # 0 is off, 1 and 2 are the cage + smooth / smooth preview modes
+                if bool(current) != profile['smooth_mesh_preview'] and not cmds.getAttr(plug, lock=True):
+                    restore_smooth[plug] = current
+                    cmds.setAttr(plug, 2 if profile['smooth_mesh_preview'] else 0)
+        yield
+    finally:
+        for flag, value in restore_editor.items():
+            cmds.modelEditor(panel, edit=True, **{flag: value})
+        for plug, value in list(restore_hardware.items()) + list(restore_smooth.items()):
+            cmds.setAttr(plug, value)
+
+
+def record_run(name, frame_count, seconds, scene=None):
+    """
+    Append the render speed of a profile to the run log, so profiles can be compared
+
+    Parameters
+    ----------
+    name: str
+    frame_count: int
+    seconds: float
+    scene: str
+
+    Returns
+    -------
+    float
+        frames per second
+    """
+    fps = frame_count / seconds if seconds else 0.0
+    record = dict(time=time.time(), profile=name or 'viewport', frames=frame_count, seconds=round(seconds, 3),
+                  fps=round(fps, 2), scene=scene)
+    try:
+        if not os.path.isdir(os.path.dirname(RUN_LOG)):
+            os.makedirs(os.path.dirname(RUN_LOG))
+        with open(RUN_LOG, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+    except (IOError, OSError) as e:
+        logging.warning('Run log "{}" not written: {}'.format(RUN_LOG, e))
+    return fps
@@ -0,0 +1,160 @@
+# coding=utf-8
+"""
+Downscaled proxy sequences and a contact sheet made from the rendered frames.
+
+Every frame is decoded once and all the variants are resized from it, the frames are spread over a thread pool
+(Pillow releases the GIL while decoding, resampling and encoding). The variants go to sibling folders of the
+version dir:
+
+    flipbook/v012/shot_anim_v012.1001.jpg
+    flipbook/v012_half/shot_anim_v012.1001.jpg
+    flipbook/v012_quarter/shot_anim_v012.1001.jpg
+    flipbook/v012_contact/shot_anim_v012_contact.jpg
+
+Pillow is optional, without it the stage is skipped with a warning.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import time
+from multiprocessing.pool import ThreadPool
+
+from .sequence import FrameSequence
+
+# name -> scale of the full resolution sequence
+DEFAULT_VARIANTS = (('half', 0.5), ('quarter', 0.25))
+CONTACT_SHEET_NAME = 'contact'
+CONTACT_SHEET_COLUMNS = 6
+CONTACT_SHEET_TILES = 36
+CONTACT_SHEET_TILE_WIDTH = 320
+DEFAULT_WORKERS = min(8, multiprocessing.cpu_count())
+DEFAULT_QUALITY = 90
+
+
+def get_variant_dir(version_dir, name):
+    """
+    Sibling folder of version_dir holding the name variant, "<version_dir>_<name>"
+    """
+    return '{}_{}'.format(os.path.normpath(version_dir), name)
+
+
+def _process_frame(path, targets, tile_size=None, quality=DEFAULT_QUALITY):
+    """
+    Decode path once and write it at every target size
+
+    Parameters
+    ----------
+    path: str
+    targets: list of tuple
+        (output path, (width, height)), largest first
+    tile_size: tuple
+        also return a contact sheet tile of this size
+
+    Returns
+    -------
+    PIL.Image.Image or None
+        the tile
+    """
+    from PIL import Image
+    image = Image.open(path)
+    # the full resolution is never written, a JPEG is decoded straight at the largest size needed (DCT scaling)
+    sizes = [size for _, size in targets] + ([tile_size] if tile_size else [])
+    if sizes:
+        image.draft('RGB', max(sizes))
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    tile = None
+    # every variant is resampled from the previous, larger one
+    for target_path, size in targets:
+        if tile_size and tile is None and size[0] < tile_size[0]:
+            tile = image.resize(tile_size, Image.BILINEAR)
+        image = image.resize(size, Image.BILINEAR)
+        image.save(target_path, quality=quality)
+    if tile_size and tile is None:
+        tile = image.resize(tile_size, Image.BILINEAR)
+    return tile
+
+
+def make_proxies(first_frame_path, variants=DEFAULT_VARIANTS, contact_sheet=True, workers=None,
+                 quality=DEFAULT_QUALITY, sequence=None):
+    """
+    Write the downscaled variants of the sequence and its contact sheet
+
+    Parameters
+    ----------
+    first_frame_path: str
+        first frame of the full resolution sequence
+    variants: list of tuple
+        (name, scale) pairs
+    contact_sheet: bool
+    workers: int
+    quality: int
+        JPEG quality of the variants
+    sequence: FrameSequence
+        the frames of first_frame_path when already known, the directory is listed otherwise
+
+    Returns
+    -------
+    dict
+        variant name -> first frame path of the variant, "contact" -> contact sheet path,
+        empty when Pillow is not available
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        logging.warning('Pillow is not available, proxies and contact sheet skipped')
+        return {}
+    start = time.time()
+    frames = (sequence or FrameSequence.from_path(first_frame_path)).paths()
+    version_dir = os.path.dirname(first_frame_path)
+    width, height = Image.open(frames[0]).size
+    variants = sorted(variants, key=lambda variant: variant[1], reverse=True)
+
+    outputs = {}
+    for name, scale in variants:
+        variant_dir = get_variant_dir(version_dir, name)
+        if not os.path.isdir(variant_dir):
+            os.makedirs(variant_dir)
+        outputs[name] = os.path.join(variant_dir, os.path.basename(frames[0])).replace('\\', '/')
+
+    tile_size = None
+    tile_frames = set()
+    if contact_sheet:
+        tile_size = (CONTACT_SHEET_TILE_WIDTH, max(1, int(round(CONTACT_SHEET_TILE_WIDTH * height / width))))
+        step = max(1, -(-len(frames) // CONTACT_SHEET_TILES))
+        tile_frames = set(frames[::step])
+
+    def process(path):
+        targets = [(os.path.join(get_variant_dir(version_dir, name), os.path.basename(path)),
+                    (max(1, int(round(width * scale))), max(1, int(round(height * scale)))))
+                   for name, scale in variants]
+        return _process_frame(path, targets, tile_size if path in tile_frames else None, quality)
+
+    pool = ThreadPool(workers or DEFAULT_WORKERS)
+    try:
+        tiles = [tile for tile in pool.map(process, frames) if tile is not None]
+    finally:
+        pool.close()
+        pool.join()
+
+    if tiles:
+        columns = min(CONTACT_SHEET_COLUMNS, len(tiles))
+        rows = -(-len(tiles) // columns)
+        sheet = Image.new('RGB', (columns * tile_size[0], rows * tile_size[1]))
+        for index, tile in enumerate(tiles):
+            sheet.paste(tile.convert('RGB'), ((index % columns) * tile_size[0], (index // columns) * tile_size[1]))
+        sheet_dir = get_variant_dir(version_dir, CONTACT_SHEET_NAME)
+        if not os.path.isdir(sheet_dir):
+            os.makedirs(sheet_dir)
+        base_name = re.sub(r'\.\d+\.\w+$', '', os.path.basename(first_frame_path))
+        sheet_path = os.path.join(sheet_dir, '{}_{}.jpg'.format(base_name, CONTACT_SHEET_NAME))
+        sheet.save(sheet_path, quality=quality)
+        outputs[CONTACT_SHEET_NAME] = sheet_path.replace('\\', '/')
+
+    sys.stdout.write('# playblast | {} proxies of {} frames{} in {:.1f}s\n'.format(
+        len(variants), len(frames), ' and contact sheet' if tiles else '', time.time() - start))
+    return outputs
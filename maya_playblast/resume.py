@@ -0,0 +1,244 @@
+# coding=utf-8
+"""
+Resumable playblasts.
+
+render_playblast keeps a journal.json in the version dir while it renders: what is rendered (camera, range,
+settings, temp scene) and how far it got. A version whose journal is not "complete" was interrupted or crashed;
+resuming it checks which frames are valid and renders only the missing or broken ones from the temp scene,
+in mayapy workers (see maya_playblast.batch).
+
+>>> playblast.run(resume=True)
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from . import atomic
+from . import batch
+from . import integrity
+from .sequence import FrameSequence
+from .sequence import frames_to_ranges
+from .versions import list_versions
+
+JOURNAL_NAME = 'journal.json'
+DEFAULT_WORKERS = 4
+# the render and the background temp scene copy both update the journal
+_lock = threading.Lock()
+
+
+def get_journal_path(output_path):
+    return os.path.join(os.path.dirname(output_path), JOURNAL_NAME)
+
+
+def write_journal(journal):
+    """
+    Atomically replace the journal of journal["output_path"]
+    """
+    journal_path = get_journal_path(journal['output_path'])
+    try:
+        with _lock:
+            journal['updated'] = time.time()
+            atomic.write_file(journal_path, lambda f: json.dump(journal, f, indent=2, sort_keys=True))
+    except (IOError, OSError) as e:
+        # without a journal the playblast can't be resumed, but it renders all the same
+        logging.warning('Playblast journal "{}" not written: {}'.format(journal_path, e))
+
+
+def start_journal(output_path, camera, start_frame, end_frame, frame_padding=4, extension='jpg', resolution=None,
+                  render_options=None, temp_scene=None, temp_scene_state=None):
+    """
+    Write the journal of a playblast about to render
+
+    Parameters
+    ----------
+    output_path: str
+    camera: str
+    start_frame: int
+    end_frame: int
+    frame_padding: int
+    extension: str
+    resolution: tuple
+    render_options: dict
+        render_playblast keyword arguments, the batch.RENDER_OPTIONS are kept
+    temp_scene: str
+        the scene the missing frames are rendered from
+    temp_scene_state: list
+        playblast.get_scene_file_state of the temp scene, to tell whether it was replaced since
+
+    Returns
+    -------
+    dict
+    """
+    journal = dict(status='rendering', output_path=output_path, camera=str(camera), start_frame=int(start_frame),
+                   end_frame=int(end_frame), frame_padding=frame_padding, extension=extension,
+                   resolution=list(resolution) if resolution else None,
+                   render_options=dict((key, value) for key, value in (render_options or {}).items()
+                                       if key in batch.RENDER_OPTIONS),
+                   temp_scene=temp_scene, temp_scene_state=temp_scene_state, started=time.time(),
+                   valid_frames=0)
+    write_journal(journal)
+    return journal
+
+
+def record_temp_scene_state(journal, copy_thread):
+    """
+    Record the temp scene state in the journal once the background copy of the temp scene is done
+    (see playblast.save_temp_scene), the render doesn't wait for it
+
+    Returns
+    -------
+    threading.Thread
+    """
+    from . import playblast
+
+    def target():
+        copy_thread.join()
+        journal['temp_scene_state'] = playblast.get_scene_file_state(journal['temp_scene'])
+        write_journal(journal)
+
+    thread = threading.Thread(target=target)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def finish_journal(journal, status, report=None):
+    """
+    Parameters
+    ----------
+    journal: dict
+    status: str
+        "complete", "interrupted" or "broken"
+    report: dict
+        integrity.verify_sequence report, the progress recorded in the journal
+    """
+    journal['status'] = status
+    if report:
+        journal['valid_frames'] = report['expected'] - len(integrity.get_bad_frames(report))
+    write_journal(journal)
+
+
+def load_journal(version_dir):
+    try:
+        with open(os.path.join(version_dir, JOURNAL_NAME)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def find_incomplete(user_dir):
+    """
+    Journal of the most recent version of user_dir when it did not complete, the older versions were superseded
+    and are never resumed
+
+    Returns
+    -------
+    dict or None
+    """
+    if not os.path.isdir(user_dir):
+        return
+    versions = list_versions(user_dir)
+    if not versions:
+        return
+    journal = load_journal(os.path.join(user_dir, versions[0][1]))
+    if journal and journal.get('status') != 'complete':
+        return journal
+
+
+def get_resume_error(journal):
+    """
+    Why the journal can't be resumed: its temp scene is gone, was never recorded, or was replaced since
+
+    Returns
+    -------
+    str or None
+        None when it can be resumed
+    """
+    from . import playblast
+    temp_scene = journal.get('temp_scene')
+    if not temp_scene or not os.path.isfile(temp_scene):
+        return 'The temp scene of {} is gone, it can`t be resumed.'.format(journal['output_path'])
+    if not journal.get('temp_scene_state'):
+        return 'The temp scene of {} was not recorded, it can`t be resumed.'.format(journal['output_path'])
+    if playblast.get_scene_file_state(temp_scene) != journal['temp_scene_state']:
+        return 'The temp scene {} was replaced by a later playblast, {} can`t be resumed.'.format(
+            temp_scene, journal['output_path'])
+
+
+def get_missing_frames(journal):
+    """
+    Missing, empty or truncated frames of the journal range
+    """
+    report = integrity.verify_sequence(journal['output_path'], journal['start_frame'], journal['end_frame'],
+                                       journal['frame_padding'], journal['extension'])
+    return integrity.get_bad_frames(report)
+
+
+def resume_playblast(journal, workers=None, timeout=batch.DEFAULT_TIMEOUT, retries=batch.DEFAULT_RETRIES):
+    """
+    Render the missing frames of an interrupted playblast from its temp scene
+
+    Parameters
+    ----------
+    journal: dict
+        see find_incomplete
+    workers: int
+        mayapy workers rendering the missing ranges
+    timeout: float
+    retries: int
+
+    Returns
+    -------
+    str
+        first frame path
+    """
+    from . import chunked
+    from . import playblast
+    error = get_resume_error(journal)
+    if error:
+        raise RuntimeError(error)
+    temp_scene = journal['temp_scene']
+
+    missing = get_missing_frames(journal)
+    total = journal['end_frame'] - journal['start_frame'] + 1
+    sys.stdout.write('# playblast | resuming {}: {} of {} frames to render\n'.format(
+        journal['output_path'], len(missing), total))
+    if missing:
+        workers = workers or DEFAULT_WORKERS
+        chunk_size = max(1, -(-len(missing) // workers))
+        jobs = []
+        for range_start, range_end in frames_to_ranges(missing):
+            for chunk_start, chunk_end in chunked.split_frame_range(range_start, range_end, chunk_size=chunk_size):
+                job = dict(journal['render_options'],
+                           name='{}_{}-{}'.format(os.path.basename(journal['output_path']), chunk_start, chunk_end),
+                           scene=temp_scene,
+                           camera=journal['camera'],
+                           output_path=journal['output_path'],
+                           start_frame=chunk_start,
+                           end_frame=chunk_end,
+                           resolution=journal['resolution'])
+                jobs.append(job)
+        results = batch.run_jobs(jobs, workers=workers, timeout=timeout, retries=retries)
+        failed = [result for result in results if result['status'] != 'ok']
+        if failed:
+            logging.error(batch.format_report(failed))
+            raise RuntimeError('{} of {} resumed ranges failed'.format(len(failed), len(results)))
+
+    report = integrity.verify_sequence(journal['output_path'], journal['start_frame'], journal['end_frame'],
+                                       journal['frame_padding'], journal['extension'])
+    if not report['ok']:
+        finish_journal(journal, 'broken', report)
+        raise RuntimeError(integrity.format_report(report))
+    finish_journal(journal, 'complete', report)
+    playblast.temp_data['temp_scene'] = temp_scene
+    sequence = FrameSequence.from_range(journal['output_path'], journal['start_frame'], journal['end_frame'],
+                                        journal['frame_padding'], journal['extension'])
+    playblast.temp_data['sequence'] = sequence
+    first_frame_path = sequence.first_path
+    sys.stdout.write('# playblast | first frame path:\n{}\n'.format(first_frame_path))
+    return first_frame_path.replace('\\', '/')
@@ -0,0 +1,368 @@
+# coding=utf-8
+"""
+Size-budgeted eviction of the old flipbook versions and temp scenes.
+
+Every playblast adds a vNNN dir to the flipbook user dir of the task and a scene copy to USER_TEMPDIR/tsk_<id>.
+Once a budget is exceeded the least recently used entries go first, temp scenes older than the max age go anyway.
+Versions never expire: only the dialog marks the versions it publishes, so a version without a marker may well
+be in the dailies, it only goes under budget pressure. Never evicted: pinned or published versions (a .pinned /
+.published file in the version dir), the newest versions of the task and the temp scene of the current playblast.
+
+After a blast it runs in a background thread, at most once per RUN_INTERVAL. A dry run only reports:
+
+    python -m maya_playblast.retention /path/to/flipbook --budget 50G --max-age 30 --dry-run
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import argparse
+import logging
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+
+from .versions import VERSION_PATTERN
+
+PIN_FILE_NAME = '.pinned'
+PUBLISHED_FILE_NAME = '.published'
+STAMP_FILE_NAME = '.retention_stamp'
+# a version and its sibling dirs: v012, v012_half, v012_contact... and the leftovers of interrupted transfers
+VERSION_REGEX = re.compile(r'\.?' + VERSION_PATTERN + r'(_\w+|\.partial-\w+)?$')
+TEMP_DIR_REGEX = re.compile(r'tsk_\d+$')
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+TASK_FLIPBOOK_BUDGET = os.environ.get('MAYA_PLAYBLAST_FLIPBOOK_BUDGET', '100G')
+USER_TEMP_BUDGET = os.environ.get('MAYA_PLAYBLAST_TEMP_BUDGET', '20G')
+MAX_AGE_DAYS = 90
+KEEP_LATEST = 3
+RUN_INTERVAL = 60 * 60
+DAY = 24 * 60 * 60
+
+
+def parse_size(size):
+    """
+    "20G" -> 21474836480
+    """
+    match = re.match(r'\s*([\d.]+)\s*([KMGT]?)B?\s*$', str(size).upper())
+    if not match:
+        raise ValueError('Invalid size "{}"'.format(size))
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def pin(version_dir):
+    """
+    Protect a version from eviction
+    """
+    open(os.path.join(version_dir, PIN_FILE_NAME), 'a').close()
+
+
+def unpin(version_dir):
+    pin_path = os.path.join(version_dir, PIN_FILE_NAME)
+    if os.path.exists(pin_path):
+        os.remove(pin_path)
+
+
+def mark_published(version_dir):
+    open(os.path.join(version_dir, PUBLISHED_FILE_NAME), 'a').close()
+
+
+def _walk_files(paths):
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for directory, _, names in os.walk(path):
+            for name in names:
+                yield os.path.join(directory, name)
+
+
+def get_entry_stats(paths, inodes=None):
+    """
+    Size and last use of an eviction entry (a version with its sibling dirs, a temp scene with its snapshot info)
+
+    Parameters
+    ----------
+    paths: list of str
+    inodes: dict
+        filled with (device, inode) -> size, to count the hardlinks shared by entries once
+
+    Returns
+    -------
+    tuple
+        bytes freed by deleting the entry, bytes, last use time
+    """
+    total = freed = 0
+    last_used = 0
+    links = {}
+    for path in _walk_files(paths):
+        try:
+            stat = os.lstat(path)
+        except OSError:
+            continue
+        total += stat.st_size
+        # hardlinked frames (dedup, incremental) only free their space once every link is gone
+        key = (stat.st_dev, stat.st_ino)
+        if inodes is not None:
+            inodes[key] = stat.st_size
+        seen, nlink, size = links.get(key, (0, stat.st_nlink, stat.st_size))
+        links[key] = (seen + 1, nlink, size)
+        last_used = max(last_used, stat.st_mtime, stat.st_atime)
+    for seen, nlink, size in links.values():
+        if seen >= nlink:
+            freed += size
+    for path in paths:
+        try:
+            last_used = max(last_used, os.stat(path).st_mtime)
+        except OSError:
+            pass
+    return freed, total, last_used
+
+
+def get_version_entries(user_dir, inodes=None):
+    """
+    Parameters
+    ----------
+    user_dir: str
+    inodes: dict
+        see get_entry_stats
+
+    Returns
+    -------
+    list of dict
+        version (number), paths, protected (reason or None), expires (False), freed, bytes, last_used, newest first
+    """
+    groups = {}
+    for name in os.listdir(user_dir):
+        match = VERSION_REGEX.match(name)
+        if match and os.path.isdir(os.path.join(user_dir, name)):
+            groups.setdefault(int(match.group(1)), []).append(os.path.join(user_dir, name))
+    entries = []
+    for index, version in enumerate(sorted(groups, reverse=True)):
+        paths = sorted(groups[version])
+        protected = None
+        if index < KEEP_LATEST:
+            protected = 'latest'
+        for path in paths:
+            if os.path.exists(os.path.join(path, PIN_FILE_NAME)):
+                protected = 'pinned'
+            elif os.path.exists(os.path.join(path, PUBLISHED_FILE_NAME)):
+                protected = 'published'
+        freed, total, last_used = get_entry_stats(paths, inodes)
+        # published outside the dialog (run, batch, run_many) leaves no marker, so versions never age out
+        entries.append(dict(version=version, paths=paths, protected=protected, expires=False, freed=freed,
+                            bytes=total, last_used=last_used))
+    return entries
+
+
+def get_temp_scene_entries(temp_root, keep=(), inodes=None):
+    """
+    The temp scenes of every tsk_<id> dir of temp_root, the scenes in keep are protected
+    """
+    keep = set(os.path.normpath(path) for path in keep if path)
+    entries = []
+    for task_dir in os.listdir(temp_root):
+        task_path = os.path.join(temp_root, task_dir)
+        if not TEMP_DIR_REGEX.match(task_dir) or not os.path.isdir(task_path):
+            continue
+        for name in os.listdir(task_path):
+            if name.endswith('.snapshot.json'):
+                continue
+            path = os.path.join(task_path, name)
+            paths = [path] + ([path + '.snapshot.json'] if os.path.exists(path + '.snapshot.json') else [])
+            freed, total, last_used = get_entry_stats(paths, inodes)
+            entries.append(dict(paths=paths, protected='current' if os.path.normpath(path) in keep else None,
+                                expires=True, freed=freed, bytes=total, last_used=last_used))
+    return entries
+
+
+def select_evictions(entries, budget, max_age_days=MAX_AGE_DAYS, used=None, now=None):
+    """
+    The entries to delete: the unprotected expiring ones older than max_age_days, then the least recently used
+    until the rest fits the budget
+
+    Parameters
+    ----------
+    entries: list of dict
+    budget: int
+    max_age_days: float
+    used: int
+        bytes used by the entries, their summed sizes by default
+    now: float
+
+    Returns
+    -------
+    list of dict
+        the entries, each with a reason ("age" or "budget")
+    """
+    now = now or time.time()
+    total = sum(entry['bytes'] for entry in entries) if used is None else used
+    evicted = []
+    for entry in sorted(entries, key=lambda item: item['last_used']):
+        if entry['protected']:
+            continue
+        if max_age_days and entry['expires'] and now - entry['last_used'] > max_age_days * DAY:
+            reason = 'age'
+        elif total > budget and entry['freed']:
+            # an entry whose frames are all linked from newer versions frees nothing
+            reason = 'budget'
+        else:
+            continue
+        evicted.append(dict(entry, reason=reason))
+        total -= entry['freed']
+    return evicted
+
+
+def evict(entries, budget, max_age_days=MAX_AGE_DAYS, used=None, dry_run=False):
+    """
+    Parameters
+    ----------
+    entries: list of dict
+        see get_version_entries and get_temp_scene_entries
+    budget: int or str
+        bytes, or a size like "50G"
+    max_age_days: float
+    used: int
+        see select_evictions
+    dry_run: bool
+        only report what would be deleted
+
+    Returns
+    -------
+    dict
+        bytes (before), budget, evicted (entries), freed, protected (entry count), dry_run
+    """
+    budget = parse_size(budget)
+    used = sum(entry['bytes'] for entry in entries) if used is None else used
+    evicted = select_evictions(entries, budget, max_age_days, used)
+    freed = 0
+    for entry in evicted:
+        if not dry_run:
+            for path in entry['paths']:
+                try:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                    else:
+                        os.remove(path)
+                except OSError as e:
+                    logging.warning('"{}" not evicted: {}'.format(path, e))
+        freed += entry['freed']
+    return dict(bytes=used, budget=budget, evicted=evicted, freed=freed,
+                protected=len([entry for entry in entries if entry['protected']]), dry_run=dry_run)
+
+
+def format_report(report, title='Retention'):
+    lines = ['{}: {} bytes used, budget {}, {} protected, {} {} bytes{}'.format(
+        title, report['bytes'], report['budget'], report['protected'],
+        'would free' if report['dry_run'] else 'freed', report['freed'],
+        ' (dry run)' if report['dry_run'] else '')]
+    for entry in report['evicted']:
+        lines.append('  {:<7} {:>14} bytes  {}'.format(entry['reason'], entry['freed'], ', '.join(entry['paths'])))
+    return '\n'.join(lines)
+
+
+def run(flipbook_dir=None, temp_root=None, keep=(), flipbook_budget=TASK_FLIPBOOK_BUDGET,
+        temp_budget=USER_TEMP_BUDGET, max_age_days=MAX_AGE_DAYS, dry_run=False):
+    """
+    Evict the flipbook versions of a task and the temp scenes of a user
+
+    Parameters
+    ----------
+    flipbook_dir: str
+        flipbook user dir of the task
+    temp_root: str
+        USER_TEMPDIR, holding the tsk_<id> temp scene dirs
+    keep: list of str
+        temp scenes in use, the temp scene of an interrupted playblast of flipbook_dir is kept as well
+    flipbook_budget: int or str
+    temp_budget: int or str
+    max_age_days: float
+    dry_run: bool
+
+    Returns
+    -------
+    list of tuple
+        (title, evict report)
+    """
+    reports = []
+    if flipbook_dir and os.path.isdir(flipbook_dir):
+        # run(resume=True) renders the rest of it from its temp scene
+        from . import resume
+        journal = resume.find_incomplete(flipbook_dir)
+        if journal:
+            keep = list(keep) + [journal.get('temp_scene')]
+        inodes = {}
+        entries = get_version_entries(flipbook_dir, inodes)
+        report = evict(entries, flipbook_budget, max_age_days, sum(inodes.values()), dry_run)
+        reports.append(('Flipbook versions', report))
+    if temp_root and os.path.isdir(temp_root):
+        inodes = {}
+        entries = get_temp_scene_entries(temp_root, keep, inodes)
+        report = evict(entries, temp_budget, max_age_days, sum(inodes.values()), dry_run)
+        reports.append(('Temp scenes', report))
+    for title, report in reports:
+        logging.info(format_report(report, title))
+    return reports
+
+
+def _is_due(flipbook_dir):
+    stamp_path = os.path.join(flipbook_dir, STAMP_FILE_NAME)
+    try:
+        if time.time() - os.path.getmtime(stamp_path) < RUN_INTERVAL:
+            return False
+    except OSError:
+        pass
+    try:
+        open(stamp_path, 'a').close()
+        os.utime(stamp_path, None)
+    except (IOError, OSError):
+        pass
+    return True
+
+
+def run_in_background():
+    """
+    Opportunistic retention run for the current task after a playblast, at most once per RUN_INTERVAL
+
+    Returns
+    -------
+    threading.Thread or None
+    """
+    from shotgun import context
+    from . import playblast
+    flipbook_dir = context.get_userdir('flipbook')
+    if not os.path.isdir(flipbook_dir) or not _is_due(flipbook_dir):
+        return
+
+    def target():
+        try:
+            run(flipbook_dir, context.USER_TEMPDIR, keep=[playblast.temp_data.get('temp_scene')])
+        except Exception:
+            logging.exception('Retention run failed')
+
+    thread = threading.Thread(target=target)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='maya_playblast.retention', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('flipbook_dir', nargs='?', help='flipbook user dir of a task')
+    parser.add_argument('--temp-root', help='USER_TEMPDIR holding the tsk_<id> temp scenes')
+    parser.add_argument('--budget', default=TASK_FLIPBOOK_BUDGET, help='flipbook budget, e.g. 50G')
+    parser.add_argument('--temp-budget', default=USER_TEMP_BUDGET, help='temp scene budget, e.g. 20G')
+    parser.add_argument('--max-age', type=float, default=MAX_AGE_DAYS, help='days before a temp scene expires, 0 disables the age limit')
+    parser.add_argument('--dry-run', action='store_true', help='only report what would be deleted')
+    args = parser.parse_args(argv)
+    reports = run(args.flipbook_dir, args.temp_root, flipbook_budget=args.budget, temp_budget=args.temp_budget,
+                  max_age_days=args.max_age, dry_run=args.dry_run)
+    for title, report in reports:
+        sys.stdout.write(format_report(report, title) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
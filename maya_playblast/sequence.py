@@ -0,0 +1,213 @@
+# coding=utf-8
+"""
+Frame sequence index: the "<base_path>.<frame>.<extension>" files of a playblast stored as the base path, the padding
+and the frame ranges, instead of a list of paths.
+
+>>> sequence = FrameSequence.from_range('/flipbook/v012/shot_anim_v012', 1001, 1100)
+>>> sequence = FrameSequence.from_path('/flipbook/v012/shot_anim_v012.1001.jpg')  # one directory pass
+>>> sequence.first, sequence.last, 1050 in sequence, sequence.missing()
+>>> FrameSequence.from_dict(sequence.to_dict())
+
+The dict form goes into the metadata so the consumers of the playblast don't have to list the directory again.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import bisect
+import os
+import re
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+FRAME_PATH_REGEX = re.compile(r'(.*)\.(-?\d+)\.(\w+)$')
+PATTERN_REGEX = re.compile(r'(.*)\.(#+)\.(\w+)$')
+
+
+def frames_to_ranges(frames):
+    """
+    [1, 2, 3, 7, 8] -> [(1, 3), (7, 8)]
+    """
+    return merge_ranges((frame, frame) for frame in frames)
+
+
+def merge_ranges(ranges):
+    """
+    [(7, 8), (1, 2), (3, 4)] -> [(1, 4), (7, 8)]
+    """
+    merged = []
+    for start, end in sorted((int(start), int(end)) for start, end in ranges):
+        if merged and merged[-1][1] >= start - 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class FrameSequence(object):
+    """
+    Parameters
+    ----------
+    base_path: str
+        sequence path without frame number and extension
+    ranges: list of tuple
+        (start, end) inclusive frame ranges
+    padding: int
+    extension: str
+    size: int
+        bytes of the frames, when known
+    """
+
+    def __init__(self, base_path, ranges=(), padding=4, extension='jpg', size=None):
+        self.base_path = base_path.replace('\\', '/')
+        self.padding = padding
+        self.extension = extension
+        self.size = size
+        self.ranges = merge_ranges(ranges)
+        self._starts = [start for start, _ in self.ranges]
+        self._count = sum(end - start + 1 for start, end in self.ranges)
+
+    @classmethod
+    def from_range(cls, base_path, start_frame, end_frame, padding=4, extension='jpg'):
+        """
+        The sequence of a complete range, no file system access
+        """
+        return cls(base_path, [(start_frame, end_frame)], padding, extension)
+
+    @classmethod
+    def scan(cls, base_path, padding=4, extension='jpg', stat=False):
+        """
+        The frames of base_path found on disk, in a single directory pass
+
+        Parameters
+        ----------
+        base_path: str
+        padding: int
+        extension: str
+        stat: bool
+            also sum the frame sizes
+        """
+        directory, name = os.path.split(base_path)
+        regex = re.compile(re.escape(name) + r'\.(-?\d+)\.' + re.escape(extension) + '$')
+        frames = []
+        size = 0 if stat else None
+        if scandir is not None:
+            for entry in scandir(directory or '.'):
+                match = regex.match(entry.name)
+                if match:
+                    frames.append(int(match.group(1)))
+                    if stat:
+                        size += entry.stat().st_size
+        else:
+            for path in os.listdir(directory or '.'):
+                match = regex.match(path)
+                if match:
+                    frames.append(int(match.group(1)))
+                    if stat:
+                        size += os.path.getsize(os.path.join(directory, path))
+        return cls(base_path, frames_to_ranges(frames), padding, extension, size)
+
+    @classmethod
+    def from_path(cls, frame_path, stat=False):
+        """
+        Scan the sequence a frame path belongs to, the padding is taken from the frame number
+        """
+        match = FRAME_PATH_REGEX.match(frame_path)
+        if not match:
+            raise ValueError('"{}" is not a frame of a sequence'.format(frame_path))
+        return cls.scan(match.group(1), len(match.group(2)), match.group(3), stat)
+
+    @classmethod
+    def from_pattern(cls, pattern, stat=False):
+        """
+        Scan the sequence of a "<base_path>.####.<extension>" pattern, as returned by cmds.playblast
+        """
+        match = PATTERN_REGEX.match(pattern)
+        if not match:
+            raise ValueError('"{}" is not a sequence pattern'.format(pattern))
+        return cls.scan(match.group(1), len(match.group(2)), match.group(3), stat)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['base_path'], data['ranges'], data['padding'], data['extension'], data.get('size'))
+
+    def to_dict(self):
+        return dict(base_path=self.base_path, ranges=[list(frame_range) for frame_range in self.ranges],
+                    padding=self.padding, extension=self.extension, size=self.size, pattern=self.pattern,
+                    first=self.first, last=self.last, frames=len(self))
+
+    @property
+    def pattern(self):
+        """
+        "<base_path>.####.<extension>"
+        """
+        return '{}.{}.{}'.format(self.base_path, '#' * self.padding, self.extension)
+
+    @property
+    def first(self):
+        return self.ranges[0][0] if self.ranges else None
+
+    @property
+    def last(self):
+        return self.ranges[-1][1] if self.ranges else None
+
+    def __len__(self):
+        return self._count
+
+    def __bool__(self):
+        return bool(self._count)
+
+    __nonzero__ = __bool__
+
+    def __contains__(self, frame):
+        index = bisect.bisect_right(self._starts, frame) - 1
+        return index >= 0 and frame <= self.ranges[index][1]
+
+    def __iter__(self):
+        for start, end in self.ranges:
+            for frame in range(start, end + 1):
+                yield frame
+
+    def __repr__(self):
+        return 'FrameSequence({!r}, {})'.format(self.pattern, self.ranges)
+
+    def frame_path(self, frame):
+        return '{}.{}.{}'.format(self.base_path, str(int(frame)).zfill(self.padding), self.extension)
+
+    def paths(self):
+        return [self.frame_path(frame) for frame in self]
+
+    @property
+    def first_path(self):
+        return self.frame_path(self.first) if self.ranges else None
+
+    def missing(self, start_frame=None, end_frame=None):
+        """
+        Gaps of the sequence between start_frame and end_frame, the first and last frame by default
+
+        Returns
+        -------
+        list of tuple
+            (start, end) inclusive ranges
+        """
+        start_frame = self.first if start_frame is None else int(start_frame)
+        end_frame = self.last if end_frame is None else int(end_frame)
+        if start_frame is None or end_frame is None:
+            return []
+        gaps = []
+        expected = start_frame
+        for start, end in self.ranges:
+            if end < expected:
+                continue
+            if start > end_frame:
+                break
+            if start > expected:
+                gaps.append((expected, min(start - 1, end_frame)))
+            expected = end + 1
+        if expected <= end_frame:
+            gaps.append((expected, end_frame))
+        return gaps
@@ -0,0 +1,199 @@
+# coding=utf-8
+"""
+TTL cache of the Shotgun lookups done by the dialog and the playblast, stored on disk per project/task.
+
+>>> sg_cache.prefetch()  # at show() time, in a background thread
+>>> sg_cache.get_cut_range()  # later on, answered from the cache
+>>> sg_cache.peek('cut_range')  # the cached value only, never a lookup (UI thread)
+>>> sg_cache.invalidate()  # force fresh lookups
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import json
+import logging
+import os
+import threading
+import time
+
+from shotgun import SG_Shot
+from shotgun import context
+
+from . import atomic
+
+DEFAULT_TTL = 60 * 60
+CACHE_DIR_NAME = 'maya_playblast_cache'
+
+_lock = threading.RLock()
+_entries = {}
+_prefetch = {'thread': None, 'callbacks': []}
+
+
+def get_cache_path():
+    return os.path.join(context.USER_TEMPDIR, CACHE_DIR_NAME,
+                        'project_{}_task_{}.json'.format(context.project.id, context.task.id))
+
+
+def _load():
+    cache_path = get_cache_path()
+    if cache_path not in _entries:
+        try:
+            with open(cache_path) as f:
+                _entries[cache_path] = json.load(f)
+        except (IOError, OSError, ValueError):
+            _entries[cache_path] = {}
+    return cache_path, _entries[cache_path]
+
+
+def _save(cache_path, entries):
+    try:
+        if not os.path.isdir(os.path.dirname(cache_path)):
+            os.makedirs(os.path.dirname(cache_path))
+        atomic.write_file(cache_path, lambda f: json.dump(entries, f))
+    except (IOError, OSError) as e:
+        logging.warning('Shotgun cache "{}" not written: {}'.format(cache_path, e))
+
+
+def is_fresh(key, ttl=DEFAULT_TTL):
+    with _lock:
+        cache_path, entries = _load()
+        entry = entries.get(key)
+        return bool(entry) and time.time() - entry['time'] < ttl
+
+
+def peek(key, ttl=None):
+    """
+    Cached value of key without ever looking it up, None when there is none (e.g. the prefetch failed)
+
+    Parameters
+    ----------
+    key: str
+    ttl: float
+        also None when the value is older, any age by default
+
+    Returns
+    -------
+    object
+    """
+    with _lock:
+        entry = _load()[1].get(key)
+    if not entry or (ttl is not None and time.time() - entry['time'] >= ttl):
+        return None
+    return entry['value']
+
+
+def get(key, loader, ttl=DEFAULT_TTL):
+    """
+    Cached value of key, loader() is called when there is none or it is older than ttl seconds
+
+    Parameters
+    ----------
+    key: str
+    loader: callable
+        returns a JSON serializable value
+    ttl: float
+
+    Returns
+    -------
+    object
+    """
+    if is_fresh(key, ttl):
+        with _lock:
+            return _load()[1][key]['value']
+    # the lookup itself runs unlocked, a concurrent duplicate lookup is cheaper than blocking the dialog
+    value = loader()
+    with _lock:
+        cache_path, entries = _load()
+        entries[key] = dict(value=value, time=time.time())
+        _save(cache_path, entries)
+    return value
+
+
+def invalidate(key=None):
+    """
+    Drop one cached value, or all of the current project/task when key is None
+    """
+    with _lock:
+        cache_path, entries = _load()
+        if key is None:
+            entries.clear()
+        else:
+            entries.pop(key, None)
+        _save(cache_path, entries)
+
+
+def _load_cut_range():
+    shot = SG_Shot(context.entity.id)
+    try:
+        return [shot.cut_in, shot.cut_out]
+    except AttributeError:
+        logging.info('cut-in/cut-out not found')
+
+
+def get_cut_range():
+    """
+    Returns
+    -------
+    list or None
+        [cut_in, cut_out] of the current shot
+    """
+    return get('cut_range', _load_cut_range)
+
+
+def get_dailies_resolution():
+    """
+    Returns
+    -------
+    str
+        the project's "Version Resolution" field, like "1920x1080"
+    """
+    return get('dailies_resolution', lambda: context.project.sg_dailies_resolution)
+
+
+def get_entity_full_name():
+    return get('entity_full_name', lambda: context.task.entity.full_name)
+
+
+def get_step_short_name():
+    return get('step_short_name', lambda: context.task.step.short_name)
+
+
+def _run_prefetch():
+    for getter in (get_cut_range, get_dailies_resolution, get_entity_full_name, get_step_short_name):
+        try:
+            getter()
+        except Exception:
+            logging.exception('Shotgun prefetch of {} failed'.format(getter.__name__))
+    # callbacks registered after this point start a new prefetch, which is answered from the cache
+    with _lock:
+        callbacks, _prefetch['callbacks'] = _prefetch['callbacks'], []
+        _prefetch['thread'] = None
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception:
+            logging.exception('Shotgun prefetch callback failed')
+
+
+def prefetch(callback=None):
+    """
+    Fill the cache in a background thread
+
+    Parameters
+    ----------
+    callback: callable
+        called without arguments from the prefetch thread once every lookup is done
+
+    Returns
+    -------
+    threading.Thread
+    """
+    with _lock:
+        if callback:
+            _prefetch['callbacks'].append(callback)
+        thread = _prefetch['thread']
+        if thread is None:
+            thread = threading.Thread(target=_run_prefetch)
+            thread.daemon = True
+            _prefetch['thread'] = thread
+            thread.start()
+        return thread
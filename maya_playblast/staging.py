@@ -0,0 +1,155 @@
+# coding=utf-8
+"""
+Staged playblasts: the frames are rendered to a local scratch dir and transferred to the flipbook version dir
+afterwards, so the render does not wait on the network filesystem for every frame.
+
+The transfer copies the frames with a thread pool into a hidden sibling of the version dir, checking every copy
+against the md5 of its source, and renames it over the (empty) version dir at the end, so readers never see
+a half-written version. The scratch dir is removed once transferred, or when the render fails.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from multiprocessing.pool import ThreadPool
+
+from .dedup import hash_file
+from .stream import CHECKSUM_FILE_NAME
+
+SCRATCH_DIR = os.environ.get('MAYA_PLAYBLAST_SCRATCH') \
+    or os.path.join(tempfile.gettempdir(), 'maya_playblast', 'scratch')
+DEFAULT_WORKERS = 8
+BLOCK_SIZE = 1024 * 1024
+
+
+def get_scratch_path(output_path, scratch_dir=None):
+    """
+    Local render path of output_path, in a unique dir of the scratch dir
+
+    Parameters
+    ----------
+    output_path: str
+        final sequence base path
+    scratch_dir: str
+        SCRATCH_DIR by default
+
+    Returns
+    -------
+    str
+    """
+    render_dir = os.path.join(scratch_dir or SCRATCH_DIR, uuid.uuid4().hex)
+    os.makedirs(render_dir)
+    return os.path.join(render_dir, os.path.basename(output_path))
+
+
+def remove_scratch(scratch_path):
+    """
+    Remove the scratch dir of a staged render, see get_scratch_path
+    """
+    shutil.rmtree(os.path.dirname(scratch_path), ignore_errors=True)
+
+
+def copy_file(source, destination):
+    """
+    Copy source and return its md5, computed on the way, the copy is read back and hashed again
+
+    Raises
+    ------
+    IOError
+        if the copy does not have the size or the md5 of the source
+    """
+    md5 = hashlib.md5()
+    with open(source, 'rb') as source_file, open(destination, 'wb') as destination_file:
+        for block in iter(lambda: source_file.read(BLOCK_SIZE), b''):
+            md5.update(block)
+            destination_file.write(block)
+    if os.path.getsize(destination) != os.path.getsize(source):
+        raise IOError('{} was not copied completely to {}'.format(source, destination))
+    if hash_file(destination) != md5.hexdigest():
+        raise IOError('{} does not match its source {}'.format(destination, source))
+    return md5.hexdigest()
+
+
+def _move_into(partial_dir, version_dir):
+    try:
+        # an empty directory is atomically replaced on POSIX
+        os.rename(partial_dir, version_dir)
+        return
+    except OSError as e:
+        if os.name == 'nt' and not os.listdir(version_dir):
+            os.rmdir(version_dir)
+            os.rename(partial_dir, version_dir)
+            return
+        if e.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+            raise
+    # the version already holds files (another camera of run_many), every file is moved on its own
+    for name in os.listdir(partial_dir):
+        destination = os.path.join(version_dir, name)
+        if name == CHECKSUM_FILE_NAME and os.path.isfile(destination):
+            with open(os.path.join(partial_dir, name)) as f, open(destination, 'a') as destination_file:
+                destination_file.write(f.read())
+            continue
+        if os.name == 'nt' and os.path.exists(destination):
+            os.remove(destination)
+        os.rename(os.path.join(partial_dir, name), destination)
+    shutil.rmtree(partial_dir, ignore_errors=True)
+
+
+def transfer(scratch_path, output_path, workers=None):
+    """
+    Move the sequence rendered to scratch_path next to output_path
+
+    Parameters
+    ----------
+    scratch_path: str
+        sequence base path in the scratch dir, see get_scratch_path
+    output_path: str
+        final sequence base path, in the version dir
+    workers: int
+
+    Returns
+    -------
+    dict
+        files, bytes, seconds
+    """
+    start = time.time()
+    render_dir = os.path.dirname(scratch_path)
+    version_dir = os.path.normpath(os.path.dirname(output_path))
+    user_dir, version_name = os.path.split(version_dir)
+    if not os.path.isdir(version_dir):
+        os.makedirs(version_dir)
+    partial_dir = os.path.join(user_dir, '.{}.partial-{}'.format(version_name, uuid.uuid4().hex[:8]))
+    os.mkdir(partial_dir)
+    names = [name for name in os.listdir(render_dir) if name != CHECKSUM_FILE_NAME]
+
+    def copy(name):
+        return copy_file(os.path.join(render_dir, name), os.path.join(partial_dir, name))
+
+    pool = ThreadPool(min(workers or DEFAULT_WORKERS, max(1, len(names))))
+    try:
+        checksums = pool.map(copy, names)
+        with open(os.path.join(partial_dir, CHECKSUM_FILE_NAME), 'w') as f:
+            for name, md5 in sorted(zip(names, checksums)):
+                f.write('{}  {}\n'.format(md5, name))
+        _move_into(partial_dir, version_dir)
+    except Exception:
+        shutil.rmtree(partial_dir, ignore_errors=True)
+        raise
+    finally:
+        pool.close()
+        pool.join()
+    report = dict(files=len(names), bytes=sum(os.path.getsize(os.path.join(render_dir, name)) for name in names),
+                  seconds=round(time.time() - start, 3))
+    try:
+        shutil.rmtree(render_dir)
+    except OSError as e:
+        logging.warning('Scratch dir "{}" not removed: {}'.format(render_dir, e))
+    sys.stdout.write('# playblast | {files} files ({bytes} bytes) transferred in {seconds}s\n'.format(**report))
+    return report
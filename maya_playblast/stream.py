@@ -0,0 +1,295 @@
+# coding=utf-8
+"""
+Streaming post-processing: frames are handed to consumers (checksums, per frame commands, a movie encoder...)
+while the playblast is still writing the sequence.
+
+Maya holds the interpreter while cmds.playblast runs, so inside Maya the watcher runs in its own process:
+
+>>> process = start_watcher_process(output_path, 'jpg', [{'type': 'checksum'}])
+>>> cmds.playblast(...)
+>>> finish_watcher_process(process)
+
+Anywhere else (mayapy workers, tools) FrameWatcher can be used as a thread with consumer objects.
+Directory events come from inotify when the optional inotify_simple module is available, polling otherwise.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import hashlib
+import importlib
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import threading
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+from . import batch
+
+PYTHON = os.environ.get('MAYA_PLAYBLAST_PYTHON') or batch.MAYAPY
+DEFAULT_POLL_INTERVAL = 0.25
+CHECKSUM_FILE_NAME = 'checksums.md5'
+
+
+class FrameConsumer(object):
+    """
+    Base class of the stream consumers: consume() is called for every completed frame, close() after the last one
+    """
+
+    def consume(self, frame_path):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ChecksumConsumer(FrameConsumer):
+    """
+    md5 of every frame, written as "<md5>  <file name>" lines next to the frames on close
+    """
+
+    def __init__(self, output=None):
+        self.output = output
+        self.checksums = {}
+
+    def consume(self, frame_path):
+        md5 = hashlib.md5()
+        with open(frame_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                md5.update(block)
+        self.checksums[frame_path] = md5.hexdigest()
+
+    def close(self):
+        if not self.checksums:
+            return
+        output = self.output or os.path.join(os.path.dirname(sorted(self.checksums)[0]), CHECKSUM_FILE_NAME)
+        with open(output, 'w') as f:
+            for frame_path in sorted(self.checksums):
+                f.write('{}  {}\n'.format(self.checksums[frame_path], os.path.basename(frame_path)))
+
+
+class CommandConsumer(FrameConsumer):
+    """
+    Runs a shell command for every frame, e.g. a thumbnail or proxy generator.
+    "{path}", "{dir}", "{name}" (file name without extension) and "{frame}" are formatted into the command.
+    """
+
+    def __init__(self, command):
+        self.command = command
+
+    def consume(self, frame_path):
+        name = os.path.splitext(os.path.basename(frame_path))[0]
+        command = self.command.format(path=frame_path, dir=os.path.dirname(frame_path), name=name,
+                                      frame=name.rsplit('.', 1)[-1])
+        return_code = subprocess.call(command, shell=True)
+        if return_code:
+            raise RuntimeError('"{}" exited with code {}'.format(command, return_code))
+
+
+class EncoderConsumer(FrameConsumer):
+    """
+    Pipes the frames into a movie encoder (ffmpeg by default) as they arrive
+    """
+
+    def __init__(self, output, fps=24, encoder='ffmpeg', codec_args=('-c:v', 'libx264', '-pix_fmt', 'yuv420p')):
+        self.output = output
+        self.command = [encoder, '-y', '-loglevel', 'error', '-f', 'image2pipe', '-framerate', str(fps), '-i', '-'] \
+            + list(codec_args) + [output]
+        self.process = None
+
+    def consume(self, frame_path):
+        if self.process is None:
+            self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE)
+        with open(frame_path, 'rb') as f:
+            self.process.stdin.write(f.read())
+
+    def close(self):
+        if self.process is None:
+            return
+        self.process.stdin.close()
+        if self.process.wait():
+            raise RuntimeError('"{}" exited with code {}'.format(' '.join(self.command), self.process.returncode))
+
+
+CONSUMERS = {
+    'checksum': ChecksumConsumer,
+    'command': CommandConsumer,
+    'encoder': EncoderConsumer,
+}
+
+
+def create_consumer(spec):
+    """
+    Build a consumer from a JSON friendly spec
+
+    Parameters
+    ----------
+    spec: dict
+        {"type": <"checksum", "command", "encoder" or "some.module:ConsumerClass">, <constructor keyword arguments>}
+
+    Returns
+    -------
+    FrameConsumer
+    """
+    spec = dict(spec)
+    consumer_type = spec.pop('type')
+    if consumer_type in CONSUMERS:
+        consumer_class = CONSUMERS[consumer_type]
+    else:
+        module_name, class_name = consumer_type.split(':')
+        consumer_class = getattr(importlib.import_module(module_name), class_name)
+    return consumer_class(**spec)
+
+
+class FrameWatcher(threading.Thread):
+    """
+    Watches the directory of a sequence and feeds every completed frame to the consumers.
+    A frame counts as completed on its inotify close-write event, or, when polling, as soon as a later frame
+    appears. Every frame left is fed once finish() is called.
+    """
+
+    def __init__(self, output_path, extension='jpg', consumers=(), poll_interval=DEFAULT_POLL_INTERVAL):
+        super(FrameWatcher, self).__init__()
+        self.daemon = True
+        self.directory = os.path.dirname(output_path)
+        self.regex = re.compile(re.escape(os.path.basename(output_path)) + r'\.(\d+)\.' + re.escape(extension) + '$')
+        self.consumers = list(consumers)
+        self.poll_interval = poll_interval
+        self.finished = threading.Event()
+        self.fed = set()
+        self.errors = []
+
+    def finish(self):
+        """
+        The playblast is done: feed the remaining frames, close the consumers and wait for it
+        """
+        self.finished.set()
+        self.join()
+
+    def run(self):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        try:
+            if INotify is not None:
+                self._watch_inotify()
+            else:
+                self._watch_polling()
+            # whatever is left once the playblast is over is complete
+            for frame, name in sorted(self._scan().items()):
+                self._feed(name)
+        finally:
+            for consumer in self.consumers:
+                try:
+                    consumer.close()
+                except Exception as e:
+                    logging.exception('Stream consumer {} failed'.format(consumer))
+                    self.errors.append(str(e))
+
+    def _scan(self):
+        frames = {}
+        for name in os.listdir(self.directory):
+            match = self.regex.match(name)
+            if match and name not in self.fed:
+                frames[int(match.group(1))] = name
+        return frames
+
+    def _feed(self, name):
+        self.fed.add(name)
+        frame_path = os.path.join(self.directory, name)
+        for consumer in self.consumers:
+            try:
+                consumer.consume(frame_path)
+            except Exception as e:
+                logging.exception('Stream consumer {} failed on {}'.format(consumer, frame_path))
+                self.errors.append(str(e))
+
+    def _watch_inotify(self):
+        inotify = INotify()
+        inotify.add_watch(self.directory, inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO)
+        try:
+            # frames written before the watch started (e.g. reused by an incremental playblast), but for the newest
+            # one that cmds.playblast may still be writing: its close-write event, or the final scan, feeds it
+            frames = self._scan()
+            for frame in sorted(frames)[:-1]:
+                self._feed(frames[frame])
+            while not self.finished.is_set():
+                for event in inotify.read(timeout=int(self.poll_interval * 1000)):
+                    if self.regex.match(event.name) and event.name not in self.fed:
+                        self._feed(event.name)
+        finally:
+            inotify.close()
+
+    def _watch_polling(self):
+        while not self.finished.is_set():
+            frames = self._scan()
+            # frames are written in order, so every frame before the newest one is complete
+            for frame in sorted(frames)[:-1]:
+                self._feed(frames[frame])
+            self.finished.wait(self.poll_interval)
+
+
+def start_watcher_process(output_path, extension, consumer_specs, python=PYTHON):
+    """
+    Run a FrameWatcher in its own process, it keeps watching until finish_watcher_process is called
+
+    Parameters
+    ----------
+    output_path: str
+        sequence base path, without frame number and extension
+    extension: str
+    consumer_specs: list of dict
+        see create_consumer
+    python: str
+        interpreter for the watcher process
+
+    Returns
+    -------
+    subprocess.Popen
+    """
+    env = batch.get_subprocess_env()
+    command = [python, '-m', 'maya_playblast.stream', output_path, extension, json.dumps(consumer_specs)]
+    return subprocess.Popen(command, stdin=subprocess.PIPE, env=env)
+
+
+def finish_watcher_process(process):
+    """
+    Tell the watcher process the playblast is over and wait for the consumers to finish
+
+    Parameters
+    ----------
+    process: subprocess.Popen
+
+    Returns
+    -------
+    bool
+        True if every consumer succeeded
+    """
+    process.stdin.close()
+    if process.wait():
+        logging.error('Stream post-processing failed with code {}'.format(process.returncode))
+        return False
+    return True
+
+
+def main(argv=None):
+    output_path, extension, consumer_specs = (argv or sys.argv[1:])[:3]
+    logging.basicConfig(level=logging.INFO)
+    watcher = FrameWatcher(output_path, extension, [create_consumer(spec) for spec in json.loads(consumer_specs)])
+    watcher.start()
+    # the parent closes stdin once the playblast is over
+    sys.stdin.read()
+    watcher.finish()
+    sys.stdout.write('# playblast | stream: {} frame(s) post-processed\n'.format(len(watcher.fed)))
+    # the parent only gets the exit code, the errors go to its output
+    for error in watcher.errors:
+        sys.stderr.write('# playblast | stream consumer error: {}\n'.format(error))
+    return 1 if watcher.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
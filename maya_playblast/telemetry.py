@@ -0,0 +1,200 @@
+# coding=utf-8
+"""
+Per-stage timing telemetry of the playblasts.
+
+A run collects spans (stage name + wall time) and is written as telemetry.json next to the frames,
+appended to a local rolling log and handed to the registered hooks:
+
+>>> run = telemetry.start_run(origin='dialog')
+>>> with telemetry.span('render'):
+...     cmds.playblast(...)
+>>> telemetry.finish_run(run, output_path=first_frame_path)
+
+Hooks are callables taking the record dict, registered with register_hook or named in the
+MAYA_PLAYBLAST_TELEMETRY_HOOK environment variable as "module:function".
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import contextlib
+import getpass
+import importlib
+import json
+import logging
+import os
+import socket
+import time
+
+from .sequence import FrameSequence
+
+TELEMETRY_FILE_NAME = 'telemetry.json'
+TELEMETRY_LOG = os.environ.get('MAYA_PLAYBLAST_TELEMETRY_LOG') \
+    or os.path.join(os.path.expanduser('~'), '.maya_playblast', 'telemetry.log')
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+
+HOOKS = []
+_current = {'run': None}
+
+
+class Run(object):
+
+    def __init__(self, **fields):
+        self.start = time.time()
+        self.record = dict(start=self.start, host=socket.gethostname(), user=getpass.getuser(), stages=[])
+        self.record.update(fields)
+
+    @contextlib.contextmanager
+    def span(self, stage, **fields):
+        """
+        Time the with block as a stage, the yielded dict takes extra fields of the stage
+        """
+        entry = dict(stage=stage)
+        entry.update(fields)
+        start = time.time()
+        try:
+            yield entry
+        finally:
+            entry['seconds'] = round(time.time() - start, 4)
+            self.record['stages'].append(entry)
+
+    def timed(self, stage, function):
+        """
+        function wrapped in a span, for stages running in other threads
+        """
+        def wrapper(*args, **kwargs):
+            with self.span(stage):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def stage_seconds(self, stage):
+        return sum(entry['seconds'] for entry in self.record['stages'] if entry['stage'] == stage)
+
+
+def register_hook(hook):
+    """
+    Parameters
+    ----------
+    hook: callable
+        called with every finished run record
+    """
+    HOOKS.append(hook)
+
+
+def start_run(**fields):
+    """
+    Start a run and make it the current one, spans outside of a run are not recorded
+
+    Returns
+    -------
+    Run
+    """
+    run = Run(**fields)
+    _current['run'] = run
+    return run
+
+
+def current_run():
+    return _current['run']
+
+
+@contextlib.contextmanager
+def span(stage, **fields):
+    """
+    Span of the current run, a plain with block when there is none
+    """
+    run = _current['run']
+    if run is None:
+        yield dict(fields)
+        return
+    with run.span(stage, **fields) as entry:
+        yield entry
+
+
+def get_sequence_stats(first_frame_path):
+    """
+    Frame count and bytes of the sequence first_frame_path belongs to
+    """
+    try:
+        sequence = FrameSequence.from_path(first_frame_path, stat=True)
+    except (OSError, ValueError):
+        return 0, 0
+    return len(sequence), sequence.size
+
+
+def _rotate_log():
+    if not os.path.isfile(TELEMETRY_LOG) or os.path.getsize(TELEMETRY_LOG) < LOG_MAX_BYTES:
+        return
+    for index in range(LOG_BACKUPS - 1, 0, -1):
+        older = '{}.{}'.format(TELEMETRY_LOG, index)
+        if os.path.exists(older):
+            if os.path.exists('{}.{}'.format(TELEMETRY_LOG, index + 1)):
+                os.remove('{}.{}'.format(TELEMETRY_LOG, index + 1))
+            os.rename(older, '{}.{}'.format(TELEMETRY_LOG, index + 1))
+    os.rename(TELEMETRY_LOG, TELEMETRY_LOG + '.1')
+
+
+def _get_hooks():
+    hooks = list(HOOKS)
+    hook_name = os.environ.get('MAYA_PLAYBLAST_TELEMETRY_HOOK')
+    if hook_name:
+        try:
+            module_name, function_name = hook_name.split(':')
+            hooks.append(getattr(importlib.import_module(module_name), function_name))
+        except Exception as e:
+            logging.warning('Telemetry hook "{}" not loaded: {}'.format(hook_name, e))
+    return hooks
+
+
+def finish_run(run=None, output_path=None, **fields):
+    """
+    Close the run and write its record
+
+    Parameters
+    ----------
+    run: Run
+        the current run by default
+    output_path: str
+        first frame path, the record goes next to the frames
+    fields
+        extra record fields, e.g. status; frames and output_bytes when already known, the sequence of output_path
+        is listed otherwise
+
+    Returns
+    -------
+    dict
+        the record
+    """
+    run = run or _current['run']
+    if run is None:
+        return
+    if _current['run'] is run:
+        _current['run'] = None
+    record = run.record
+    record.update(fields)
+    record['seconds'] = round(time.time() - run.start, 4)
+    if output_path:
+        record['output_path'] = output_path
+        if record.get('frames') is None or record.get('output_bytes') is None:
+            record['frames'], record['output_bytes'] = get_sequence_stats(output_path)
+        render_seconds = run.stage_seconds('render')
+        if render_seconds and record['frames']:
+            record['fps'] = round(record['frames'] / render_seconds, 2)
+        try:
+            with open(os.path.join(os.path.dirname(output_path), TELEMETRY_FILE_NAME), 'w') as f:
+                json.dump(record, f, indent=2, sort_keys=True)
+        except (IOError, OSError) as e:
+            logging.warning('Telemetry not written next to the frames: {}'.format(e))
+    try:
+        if not os.path.isdir(os.path.dirname(TELEMETRY_LOG)):
+            os.makedirs(os.path.dirname(TELEMETRY_LOG))
+        _rotate_log()
+        with open(TELEMETRY_LOG, 'a') as f:
+            f.write(json.dumps(record, sort_keys=True) + '\n')
+    except (IOError, OSError) as e:
+        logging.warning('Telemetry log "{}" not written: {}'.format(TELEMETRY_LOG, e))
+    for hook in _get_hooks():
+        try:
+            hook(record)
+        except Exception:
+            logging.exception('Telemetry hook {} failed'.format(hook))
+    return record
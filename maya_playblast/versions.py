@@ -0,0 +1,150 @@
+# coding=utf-8
+"""
+Version allocation for the flipbook directories.
+
+A version is claimed with os.mkdir, which is atomic even on NFS, so concurrent playblasts (or a batch farm)
+never get the same vNNN. The last allocated number is kept in a small index file next to the versions,
+so the directory is only listed when the index is missing or found to be far behind.
+"""
+from __future__ import absolute_import, print_function, unicode_literals, division
+
+import errno
+import logging
+import os
+import re
+
+from . import atomic
+
+INDEX_FILE_NAME = '.versions_index'
+VERSION_PATTERN = r'v(\d{3,})'
+VERSION_REGEX = re.compile(VERSION_PATTERN + '$')
+# collisions in a row before the index is considered stale and the directory is listed again
+RESCAN_AFTER = 8
+MAX_ATTEMPTS = 1000
+
+
+def format_version(version):
+    return 'v' + str(version).zfill(3)
+
+
+def parse_version(name):
+    """
+    "v012" -> 12, None for the names that are not a version
+    """
+    match = VERSION_REGEX.match(name)
+    return int(match.group(1)) if match else None
+
+
+def list_versions(user_dir):
+    """
+    The vNNN entries of user_dir, newest first
+
+    Returns
+    -------
+    list of tuple
+        (number, name)
+    """
+    versions = []
+    for path in os.listdir(user_dir):
+        version = parse_version(path)
+        if version is not None:
+            versions.append((version, path))
+    return sorted(versions, reverse=True)
+
+
+def scan_last_version(user_dir):
+    """
+    Highest vNNN number found by listing user_dir, 0 if there is none
+    """
+    versions = list_versions(user_dir)
+    return versions[0][0] if versions else 0
+
+
+def get_previous_version_dir(version_dir, required_file=None):
+    """
+    The closest older vNNN sibling of version_dir
+
+    Parameters
+    ----------
+    version_dir: str
+    required_file: str
+        only consider the versions that have this file
+
+    Returns
+    -------
+    str or None
+    """
+    user_dir, version_name = os.path.split(os.path.normpath(version_dir))
+    current = parse_version(version_name)
+    if current is None or not os.path.isdir(user_dir):
+        return
+    for version, path in list_versions(user_dir):
+        if version < current and (required_file is None
+                                  or os.path.isfile(os.path.join(user_dir, path, required_file))):
+            return os.path.join(user_dir, path)
+
+
+def read_index(user_dir):
+    """
+    Last allocated version number stored in the index, None if the index is missing or broken
+    """
+    try:
+        with open(os.path.join(user_dir, INDEX_FILE_NAME)) as f:
+            return int(f.read().strip())
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def write_index(user_dir, version):
+    """
+    Atomically replace the index: the number is written to a unique temp file which is renamed over the index
+    """
+    index_path = os.path.join(user_dir, INDEX_FILE_NAME)
+    try:
+        atomic.write_file(index_path, lambda f: f.write(str(version)))
+    except (IOError, OSError) as e:
+        # the index is only a hint, a failed write costs a directory listing next time
+        logging.warning('Version index "{}" not written: {}'.format(index_path, e))
+
+
+def allocate_version(user_dir):
+    """
+    Reserve the next version directory of user_dir
+
+    Parameters
+    ----------
+    user_dir: str
+
+    Returns
+    -------
+    version_string: str
+        "vNNN"
+    version_dir: str
+        the created, and therefore reserved, version directory
+    """
+    if not os.path.isdir(user_dir):
+        try:
+            os.makedirs(user_dir)
+        except OSError:
+            if not os.path.isdir(user_dir):
+                raise
+    last_version = read_index(user_dir)
+    if last_version is None:
+        last_version = scan_last_version(user_dir)
+    version = last_version + 1
+    collisions = 0
+    for _ in range(MAX_ATTEMPTS):
+        version_dir = os.path.join(user_dir, format_version(version))
+        try:
+            os.mkdir(version_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+            collisions += 1
+            if collisions == RESCAN_AFTER:
+                version = max(version, scan_last_version(user_dir))
+            version += 1
+            continue
+        write_index(user_dir, version)
+        return format_version(version), version_dir
+    raise RuntimeError('No free version found in "{}" after {} attempts'.format(user_dir, MAX_ATTEMPTS))